@@ -0,0 +1,127 @@
+"""
+Benchmark ZonosTTS acceleration modes (see TTSModel in ttsv/model.py).
+
+Loads the model once per mode set, synthesizes the same --lines lines of a
+text file with a fixed seed and reports the real-time factor (synthesis
+seconds per second of audio) and speed-up over the first mode set, which
+is the reference. As a quick quality check, every line is compared with the
+reference mode's version of it: the correlation of their long-term average
+log spectra (1.0 = identical spectral envelope) and their duration ratio.
+Sampling diverges between precisions, so waveforms aren't compared sample
+by sample; listen to the --save-audio output before settling on a mode.
+
+    python benchmarks/bench_acceleration.py
+    python benchmarks/bench_acceleration.py --modes none inference_mode inference_mode,int8
+    python benchmarks/bench_acceleration.py --lines 20 --json accel.json --save-audio accel
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+from ttsv import config
+from ttsv.process_file import read_input_lines, to_int16
+
+DEFAULT_MODES = [
+    "none",
+    "inference_mode",
+    "inference_mode,bf16",
+    "inference_mode,int8",
+    "inference_mode,compile",
+]
+
+
+def average_log_spectrum(audio, frame=1024, hop=256):
+    """Mean log-magnitude spectrum over Hann-windowed frames."""
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if audio.size < frame:
+        audio = np.pad(audio, (0, frame - audio.size))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame)[::hop] * np.hanning(frame)
+    return np.log(np.abs(np.fft.rfft(frames, axis=-1)).mean(axis=0) + 1e-6)
+
+
+def spectral_similarity(audio, reference):
+    """Pearson correlation of the two clips' average log spectra."""
+    return float(np.corrcoef(average_log_spectrum(audio), average_log_spectrum(reference))[0, 1])
+
+
+def parse_modes(value):
+    return [] if value == "none" else [mode for mode in value.split(",") if mode]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ZonosTTS acceleration modes.")
+    parser.add_argument("--text-file", default=f"{config.INPUT_DIRECTORY}/TestFull-en.txt")
+    parser.add_argument("--language", default="en-us")
+    parser.add_argument("--lines", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=DEFAULT_MODES,
+                        help="Comma-separated mode sets to compare ('none' = plain eager float32); "
+                             "the first is the reference.")
+    parser.add_argument("--threads", type=int, help="torch threads (default: torch's choice).")
+    parser.add_argument("--save-audio", help="Write every mode's clips as WAVs under this directory.")
+    parser.add_argument("--json", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+
+    import torch
+    from ttsv.model import ZonosTTS
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    texts = [text for _, text in read_input_lines(args.text_file)][: args.lines]
+    results, reference = {}, None
+    for mode_set in args.modes:
+        start = time.perf_counter()
+        model = ZonosTTS(model_path=config.MODEL_PATH, reference_audio_path=config.REFERENCE_AUDIO_PATH,
+                         language=args.language, acceleration=parse_modes(mode_set))
+        load_seconds = time.perf_counter() - start
+        sample_rate = model.synthesizer.output_sample_rate
+
+        audios, seconds = [], 0.0
+        for index, text in enumerate(texts):
+            start = time.perf_counter()
+            audios.append(model.tts(text, seed=421 + index))  # same seed per line in every mode
+            seconds += time.perf_counter() - start
+        audio_seconds = sum(audio.size for audio in audios) / sample_rate
+
+        result = {
+            "load_seconds": load_seconds,
+            "seconds": seconds,
+            "audio_seconds": audio_seconds,
+            "rtf": seconds / max(audio_seconds, 1e-9),
+            "timings": dict(model.timings),
+        }
+        if reference is None:
+            reference = (mode_set, audios, result["rtf"])
+        else:
+            similarities = [spectral_similarity(audio, ref) for audio, ref in zip(audios, reference[1])]
+            durations = [audio.size / max(ref.size, 1) for audio, ref in zip(audios, reference[1])]
+            result.update({
+                "speedup": reference[2] / result["rtf"],
+                "spectral_similarity_mean": float(np.mean(similarities)),
+                "spectral_similarity_min": float(np.min(similarities)),
+                "duration_ratio_mean": float(np.mean(durations)),
+            })
+        results[mode_set] = result
+
+        if args.save_audio:
+            mode_dir = os.path.join(args.save_audio, mode_set.replace(",", "+"))
+            os.makedirs(mode_dir, exist_ok=True)
+            for index, audio in enumerate(audios, start=1):
+                write_wav(os.path.join(mode_dir, f"{index}.wav"), sample_rate, to_int16(audio.copy()))
+
+        line = f"{mode_set:>24}: load {load_seconds:6.1f}s, RTF {result['rtf']:.3f}"
+        if "speedup" in result:
+            line += (f", {result['speedup']:.2f}x vs {reference[0]}, spectral similarity "
+                     f"{result['spectral_similarity_mean']:.3f} (min {result['spectral_similarity_min']:.3f}), "
+                     f"duration ratio {result['duration_ratio_mean']:.2f}")
+        print(line)
+        del model
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark long-line synthesis with and without boundary-aware chunking.
+
+Builds paragraphs of roughly --paragraph-chars characters from a text file
+and synthesizes each one whole (unchunked), and split with
+ttsv.chunking.split_text into a single batched call whose outputs are
+crossfaded. Reports latency and real-time factor per mode. Uses ZonosTTS
+(config MODEL_PATH / REFERENCE_AUDIO_PATH) unless --fake is given.
+
+    python benchmarks/bench_chunking.py --paragraphs 5 --paragraph-chars 400
+    python benchmarks/bench_chunking.py --fake --latency-per-second 0.5
+"""
+import json
+import time
+import argparse
+from ttsv import config
+from ttsv.chunking import split_text, crossfade_join
+
+
+def make_paragraphs(path, count, paragraph_chars):
+    """Join consecutive lines of `path` into `count` paragraphs of about `paragraph_chars`."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    paragraphs, current = [], ""
+    for line in lines * (1 + count * paragraph_chars // max(1, sum(map(len, lines)))):
+        current = f"{current} {line}" if current else line
+        if len(current) >= paragraph_chars:
+            paragraphs.append(current)
+            current = ""
+            if len(paragraphs) == count:
+                break
+    return paragraphs
+
+
+def synthesize_chunked(model, text, max_chars, fade_ms):
+    chunks = split_text(text, max_chars)
+    if len(chunks) > 1 and hasattr(model, "tts_batch"):
+        audios = model.tts_batch(chunks)
+    else:
+        audios = [model.tts(chunk) for chunk in chunks]
+    return crossfade_join(audios, model.synthesizer.output_sample_rate, fade_ms), len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked vs unchunked long-line synthesis.")
+    parser.add_argument("--text-file", default=f"{config.INPUT_DIRECTORY}/TestFull-en.txt")
+    parser.add_argument("--language", default="en-us")
+    parser.add_argument("--paragraphs", type=int, default=5)
+    parser.add_argument("--paragraph-chars", type=int, default=400)
+    parser.add_argument("--max-chars", type=int, default=config.MAX_CHARS_PER_LINE)
+    parser.add_argument("--fade-ms", type=float, default=config.CHUNK_CROSSFADE_MS)
+    parser.add_argument("--fake", action="store_true", help="Use the deterministic fake model.")
+    parser.add_argument("--latency-per-second", type=float, default=0.0,
+                        help="With --fake: synthesis time per second of audio.")
+    parser.add_argument("--json", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_tts import FakeTTS
+        model = FakeTTS(latency_per_second=args.latency_per_second, language=args.language)
+    else:
+        from ttsv.model import ZonosTTS
+        model = ZonosTTS(model_path=config.MODEL_PATH, reference_audio_path=config.REFERENCE_AUDIO_PATH,
+                         language=args.language)
+        model.tts("Warm up.")
+    sample_rate = model.synthesizer.output_sample_rate
+
+    paragraphs = make_paragraphs(args.text_file, args.paragraphs, args.paragraph_chars)
+    results = {"unchunked": [], "chunked": []}
+    for index, paragraph in enumerate(paragraphs, start=1):
+        start = time.perf_counter()
+        audio = model.tts(paragraph)
+        seconds = time.perf_counter() - start
+        results["unchunked"].append({
+            "chars": len(paragraph), "seconds": seconds, "audio_seconds": len(audio) / sample_rate
+        })
+
+        start = time.perf_counter()
+        audio, num_chunks = synthesize_chunked(model, paragraph, args.max_chars, args.fade_ms)
+        chunked_seconds = time.perf_counter() - start
+        results["chunked"].append({
+            "chars": len(paragraph), "chunks": num_chunks,
+            "seconds": chunked_seconds, "audio_seconds": len(audio) / sample_rate
+        })
+        print(f"paragraph {index} ({len(paragraph)} chars): unchunked {seconds:.2f}s, "
+              f"chunked {chunked_seconds:.2f}s in {num_chunks} chunks")
+
+    for mode, runs in results.items():
+        seconds = sum(run["seconds"] for run in runs)
+        audio_seconds = sum(run["audio_seconds"] for run in runs)
+        print(f"{mode:>9}: {seconds:7.2f}s total, {seconds / max(1, len(runs)):6.2f}s per paragraph, "
+              f"RTF {seconds / max(audio_seconds, 1e-9):.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the merge stage on a synthetic document.
+
+Compares the previous strategy (read and convert every clip once per
+REPETITION_PATTERN_WAVE slot) with merge_wav_files, which memory-maps each
+clip once per line and reuses it for every repetition. Both write the
+merged timeline to a WavSink in a temporary directory.
+
+    python benchmarks/bench_merge.py --lines 163
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from scipy.io.wavfile import read as read_wav, write as write_wav
+from ttsv.config import REPETITION_PATTERN_WAVE
+from ttsv.merge import merge_wav_files
+from ttsv.audio_stream import WavSink
+
+
+def make_document(directory, lines, channel_lang, sample_rate, seconds_per_line):
+    """Write one tone per (line, language) and return a gather_files-style map."""
+    file_map = {}
+    rng = np.random.default_rng(0)
+    for line_num in range(1, lines + 1):
+        for lang in (channel_lang, "en"):
+            num_samples = int(sample_rate * seconds_per_line * rng.uniform(0.5, 1.5))
+            t = np.arange(num_samples, dtype=np.float32) / sample_rate
+            audio = (0.5 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+            wav_path = os.path.join(directory, f"{line_num}-{lang}.wav")
+            write_wav(wav_path, sample_rate, audio)
+            file_map[(line_num, lang)] = {
+                "wav_path": wav_path,
+                "txt_path": "",
+                "duration_ms": int(num_samples / sample_rate * 1000),
+            }
+    return file_map
+
+
+def legacy_merge(file_map, channel_lang, max_line_num, sink):
+    """The pre-mmap merge loop: one read + float conversion per pattern slot."""
+    stats = {"reads": 0, "bytes_read": 0}
+    sample_rate = None
+    for line_num in range(1, max_line_num + 1):
+        for wave_entry in REPETITION_PATTERN_WAVE:
+            lang = channel_lang if wave_entry == 0 else "en"
+            info = file_map.get((line_num, lang))
+            if not info:
+                continue
+            sr, audio_data = read_wav(info["wav_path"])
+            if sample_rate is None:
+                sample_rate = sr
+                sink.open(sample_rate)
+            stats["reads"] += 1
+            stats["bytes_read"] += audio_data.nbytes
+            audio_data = audio_data.astype(np.float32) / 32767.0
+            sink.write((audio_data * 32767).astype(np.int16))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the merge stage.")
+    parser.add_argument("--lines", type=int, default=163)
+    parser.add_argument("--channel", default="de")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--seconds-per-line", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_map = make_document(tmp, args.lines, args.channel, args.sample_rate, args.seconds_per_line)
+
+        results = {}
+        for name, fn in (("legacy", legacy_merge), ("mmap", merge_wav_files)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                with WavSink(os.path.join(tmp, f"merged-{name}.wav")) as sink:
+                    start = time.perf_counter()
+                    fn(file_map, args.channel, args.lines, sink)
+                best = min(best, time.perf_counter() - start)
+            results[name] = (best, sink.frames_written)
+
+        distinct = sum(os.path.getsize(info["wav_path"]) for info in file_map.values())
+        with WavSink(os.path.join(tmp, "merged-stats.wav")) as sink:
+            legacy_stats = legacy_merge(file_map, args.channel, args.lines, sink)
+
+    print(f"{args.lines} lines, pattern {REPETITION_PATTERN_WAVE}")
+    print(f"  legacy: {results['legacy'][0]:.3f}s, {legacy_stats['reads']} reads, "
+          f"{legacy_stats['bytes_read'] / 1e6:.1f} MB read + converted")
+    print(f"  mmap:   {results['mmap'][0]:.3f}s, {len(file_map)} clips mapped, "
+          f"{distinct / 1e6:.1f} MB on disk")
+    assert results["legacy"][1] == results["mmap"][1], "both strategies must write the same number of frames"
+    print(f"  speedup: {results['legacy'][0] / max(results['mmap'][0], 1e-9):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
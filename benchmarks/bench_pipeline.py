@@ -0,0 +1,195 @@
+"""
+Benchmark the pipeline end to end with a deterministic fake TTS model.
+
+For each document size, writes a synthetic {FILENAME_TO_PROCESS}-{lang}.txt
+pair in a scratch directory and times every stage: text processing,
+synthesis with the fake model (with WAV writing measured separately),
+gather_files, merge_wav_files, create_subtitles and the ffmpeg encode
+(skipped when ffmpeg isn't on PATH). Results are printed and can be written
+as JSON; stages more than --tolerance slower than a stored baseline are
+flagged and make the run exit with status 1.
+
+    python benchmarks/bench_pipeline.py --lines 10 100 1000 --json results.json
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py --lines 10000 --skip-encode
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import numpy as np
+from ttsv import config
+from ttsv import process_file
+from ttsv.merge import gather_files, merge_wav_files, create_subtitles, merged_wav_path
+from ttsv.audio_stream import WavSink
+from fake_tts import FakeTTS
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+WORDS = (
+    "der die das und nicht mit sich auf für ist im dem ein eine als auch es an "
+    "the of and to in is you that it he was for on are as with his they at be"
+).split()
+
+
+def write_document(input_dir, lines, langs, seed=0):
+    """Write `lines` deterministic sentences of 3-20 words per language."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(input_dir, exist_ok=True)
+    for lang in langs:
+        with open(os.path.join(input_dir, f"{config.FILENAME_TO_PROCESS}-{lang}.txt"), "w", encoding="utf-8") as f:
+            for _ in range(lines):
+                words = rng.choice(WORDS, size=rng.integers(3, 21))
+                f.write(" ".join(words).capitalize() + ".\n")
+
+
+class StageTimer:
+    """Seconds per stage; safe to update from the synthesis writer threads."""
+    def __init__(self):
+        self.seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def wrap(self, stage, fn):
+        """`fn`, with the time spent in it added to `stage`."""
+        def timed(*args, **kwargs):
+            return self.time(stage, fn, *args, **kwargs)
+        return timed
+
+
+def run_size(lines, channel, model_args, encode):
+    """Run every stage for a `lines`-line document in the current directory."""
+    timer = StageTimer()
+    langs = [channel, "en"]
+    write_document(config.INPUT_DIRECTORY, lines, langs)
+
+    for lang in langs:
+        timer.time("text_processing", process_file.read_input_lines,
+                   os.path.join(config.INPUT_DIRECTORY, f"{config.FILENAME_TO_PROCESS}-{lang}.txt"))
+
+    model = FakeTTS(**model_args)
+    model.tts = timer.wrap("fake_tts", model.tts)
+    write_wav, use_cache = process_file.write_wav, process_file.USE_SYNTHESIS_CACHE
+    process_file.write_wav = timer.wrap("wav_write", write_wav)
+    # cache=None alone means "the default cache": turn it off so cache I/O isn't timed
+    process_file.USE_SYNTHESIS_CACHE = False
+    try:
+        timer.time("synthesis_total", process_file.process_input_texts,
+                   input_dir=config.INPUT_DIRECTORY, filename=config.FILENAME_TO_PROCESS,
+                   output_dir=config.OUTPUT_DIRECTORY, model=model, cache=None,
+                   num_workers=1, languages=langs)
+    finally:
+        process_file.write_wav, process_file.USE_SYNTHESIS_CACHE = write_wav, use_cache
+
+    file_map = timer.time("gather_files", gather_files, channel)
+    max_line_num = max((key[0] for key in file_map), default=0)
+    with WavSink(merged_wav_path(channel)) as sink:
+        _, timestamps = timer.time("merge_wav_files", merge_wav_files, file_map, channel, max_line_num, sink)
+    timer.time("create_subtitles", create_subtitles, file_map, channel, max_line_num, timestamps)
+
+    if encode:
+        from ttsv.generate_video import create_black_video
+        if not timer.time("ffmpeg_encode", create_black_video, channel):
+            raise RuntimeError("ffmpeg encode failed")
+
+    return {
+        "lines": lines,
+        "audio_seconds": round(sink.frames_written / sink.sample_rate, 1),
+        "stages": {stage: round(seconds, 4) for stage, seconds in timer.seconds.items()},
+    }
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """Regressions: stages slower than baseline * (1 + tolerance), ignoring tiny timings."""
+    regressions = []
+    for size, result in results.items():
+        expected = baseline.get(size, {}).get("stages", {})
+        for stage, seconds in result["stages"].items():
+            before = expected.get(stage)
+            if before is None or max(before, seconds) < min_seconds:
+                continue
+            if seconds > before * (1 + tolerance):
+                regressions.append(f"{size} lines / {stage}: {before:.3f}s -> {seconds:.3f}s "
+                                   f"(+{(seconds / max(before, 1e-9) - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline with a fake TTS model.")
+    parser.add_argument("--lines", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--channel", default=config.CHANNEL_TO_UPLOAD[0])
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--seconds-per-char", type=float, default=0.02)
+    parser.add_argument("--latency-per-second", type=float, default=0.0,
+                        help="Fake synthesis time per second of audio (0 = instant).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the fastest time of each stage is kept.")
+    parser.add_argument("--skip-encode", action="store_true")
+    parser.add_argument("--json", help="Write results to this JSON file.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Don't flag stages faster than this in both runs.")
+    args = parser.parse_args()
+
+    encode = not args.skip_encode and shutil.which("ffmpeg") is not None
+    if not args.skip_encode and not encode:
+        print("ffmpeg not found on PATH; skipping the encode stage.")
+    model_args = {
+        "sample_rate": args.sample_rate,
+        "seconds_per_char": args.seconds_per_char,
+        "latency_per_second": args.latency_per_second,
+    }
+
+    results = {}
+    cwd = os.getcwd()
+    for lines in args.lines:
+        for _ in range(max(1, args.repeat)):
+            # Output paths in ttsv.config are relative to the working directory
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    run = run_size(lines, args.channel, model_args, encode)
+                finally:
+                    os.chdir(cwd)
+            best = results.setdefault(str(lines), run)
+            for stage, seconds in run["stages"].items():
+                best["stages"][stage] = min(best["stages"][stage], seconds)
+        result = results[str(lines)]
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["stages"].items())
+        print(f"{lines:>6} lines ({result['audio_seconds']:.0f}s audio): {stages}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
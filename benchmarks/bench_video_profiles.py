@@ -0,0 +1,66 @@
+"""
+Benchmark the video encoding profiles in VIDEO_ENCODING_PROFILES.
+
+Encodes the same synthetic merged audio with every profile and reports encode
+time and output size per minute of audio. Requires ffmpeg on PATH.
+
+    python benchmarks/bench_video_profiles.py --minutes 5
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+from ttsv.config import VIDEO_ENCODING_PROFILES
+from ttsv.generate_video import build_ffmpeg_command
+
+
+def make_audio(path, minutes, sample_rate):
+    """Write a tone with short pauses, roughly shaped like merged speech."""
+    num_samples = int(minutes * 60 * sample_rate)
+    t = np.arange(num_samples, dtype=np.float32) / sample_rate
+    envelope = (np.sin(2 * np.pi * 0.25 * t) > -0.3).astype(np.float32)
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) * envelope
+    write_wav(path, sample_rate, (audio * 32767).astype(np.int16))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark video encoding profiles.")
+    parser.add_argument("--minutes", type=float, default=5.0)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--profiles", nargs="*", default=list(VIDEO_ENCODING_PROFILES))
+    parser.add_argument("--json", help="Also write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "merged.wav")
+        make_audio(audio_path, args.minutes, args.sample_rate)
+
+        for profile in args.profiles:
+            video_path = os.path.join(tmp, f"{profile}.mp4")
+            # Build first so one-off preparation (e.g. the looped frame) isn't timed
+            cmd = build_ffmpeg_command(['-i', audio_path], video_path, profile=profile)
+            start = time.perf_counter()
+            subprocess.run([cmd[0], '-loglevel', 'error', *cmd[1:]], check=True)
+            seconds = time.perf_counter() - start
+            size = os.path.getsize(video_path)
+            results[profile] = {
+                "encode_seconds": round(seconds, 3),
+                "bytes": size,
+                "bytes_per_audio_minute": int(size / args.minutes),
+                "realtime_speed": round(args.minutes * 60 / seconds, 1),
+            }
+            print(f"{profile:>13}: {seconds:7.2f}s  {size / args.minutes / 1e6:7.2f} MB/min  "
+                  f"{args.minutes * 60 / seconds:6.1f}x realtime")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"minutes": args.minutes, "profiles": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
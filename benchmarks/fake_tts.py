@@ -0,0 +1,45 @@
+"""
+Deterministic stand-in for ZonosTTS, for benchmarking the pipeline without
+downloading Zonos or running inference.
+
+FakeTTS has the attributes process_input_texts relies on (`tts`, `language`,
+`synthesizer.output_sample_rate`) and returns a tone whose length is
+proportional to the text and whose pitch is derived from it, so the same
+text always produces the same samples.
+"""
+import time
+import hashlib
+import numpy as np
+
+
+class FakeSynthesizer:
+    def __init__(self, output_sample_rate):
+        self.output_sample_rate = output_sample_rate
+
+
+class FakeTTS:
+    """
+    `seconds_per_char` of audio per character of text; `latency_per_second`
+    optionally sleeps that long per second of generated audio to mimic a
+    model's real-time factor.
+    """
+    def __init__(self, sample_rate=16000, seconds_per_char=0.02, latency_per_second=0.0, language="en-us"):
+        self.language = language
+        self.synthesizer = FakeSynthesizer(sample_rate)
+        self.seconds_per_char = seconds_per_char
+        self.latency_per_second = latency_per_second
+        self.calls = 0
+        self.audio_seconds = 0.0
+
+    def tts(self, text, speaker=None, **kwargs):
+        self.calls += 1
+        sample_rate = self.synthesizer.output_sample_rate
+        seconds = max(1, len(text)) * self.seconds_per_char
+        self.audio_seconds += seconds
+        if self.latency_per_second:
+            time.sleep(seconds * self.latency_per_second)
+
+        digest = hashlib.sha256(f"{self.language}\x1f{text}".encode("utf-8")).digest()
+        frequency = 110 + int.from_bytes(digest[:2], "little") % 330
+        t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+        return 0.5 * np.sin(2 * np.pi * frequency * t)
@@ -0,0 +1,161 @@
+"""
+Resumable video uploads (upload_video in ttsv/youtube_upload.py) against a
+local fake of YouTube's resumable upload protocol, without credentials or
+network access.
+
+The fake server accepts chunks only at the offset it has reached, so a
+resumed upload that re-sends bytes or skips ahead fails.
+"""
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("googleapiclient")
+from googleapiclient.errors import HttpError  # noqa: E402
+from ttsv import youtube_upload  # noqa: E402
+
+CHUNK_SIZE = 256 * 1024
+FILE_SIZE = 3 * CHUNK_SIZE + 1000
+METADATA = {"VIDEO_TITLE": "Resume check", "VIDEO_DESCRIPTION": "", "VIDEO_TAGS": []}
+
+
+class FakeUploadServer(ThreadingHTTPServer):
+    """Sessions are byte buffers; `fail` maps a chunk PUT number to the status it is answered with once."""
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _UploadHandler)
+        self.sessions = {}
+        self.fail = {}
+        self.puts = 0
+        self.status_queries = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            session = f"/session/{len(self.server.sessions) + 1}"
+            self.server.sessions[session] = bytearray()
+        self._send(200, headers={"Location": self.server.url + session})
+
+    def do_PUT(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            received = self.server.sessions.get(self.path)
+            if received is None:
+                return self._send(404, {"error": "unknown session"})
+            span, total = self.headers["Content-Range"].split(" ", 1)[1].split("/")
+            if span == "*":
+                self.server.status_queries += 1
+            else:
+                self.server.puts += 1
+                status = self.server.fail.pop(self.server.puts, None)
+                if status:
+                    return self._send(status, {"error": "injected failure"})
+                start = int(span.split("-")[0])
+                if start != len(received):
+                    return self._send(400, {"error": f"chunk at {start}, expected {len(received)}"})
+                received.extend(data)
+                self.server.bytes_sent += len(data)
+            if len(received) == int(total):
+                return self._send(200, {"id": f"video{self.path.rsplit('/', 1)[1]}"})
+            self._send(308, headers={"Range": f"bytes=0-{len(received) - 1}"} if received else {})
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeYouTube:
+    """Just enough of the YouTube service for upload_video: videos().insert() against `base_url`."""
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def videos(self):
+        return self
+
+    def insert(self, part, body, media_body):
+        from googleapiclient.http import HttpRequest, build_http
+        from googleapiclient.model import JsonModel
+
+        return HttpRequest(
+            build_http(), JsonModel().response,
+            f"{self.base_url}/upload/youtube/v3/videos?uploadType=resumable&part={part}",
+            method="POST", body=json.dumps(body), headers={"Content-Type": "application/json"},
+            resumable=media_body,
+        )
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(youtube_upload, "UPLOAD_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(youtube_upload, "backoff_sleep", lambda attempt: None)
+    server = FakeUploadServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(os.urandom(FILE_SIZE))
+    return str(path)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return youtube_upload.UploadSessionStore(str(tmp_path / "sessions.json"))
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_interrupted_upload_resumes_from_saved_session(server, video, sessions):
+    youtube = FakeYouTube(server.url)
+    server.fail = {2: 400}
+    with pytest.raises(HttpError):
+        youtube_upload.upload_video(youtube, video, METADATA, sessions=sessions, session_key="check")
+    assert sessions.get("check"), "the session URI was not saved"
+
+    sent_before = server.bytes_sent
+    video_id = youtube_upload.upload_video(youtube, video, METADATA, sessions=sessions, session_key="check")
+    assert server.status_queries == 1
+    assert server.bytes_sent - sent_before == FILE_SIZE - CHUNK_SIZE, "the resumed upload re-sent bytes"
+    assert server.sessions["/session/1"] == read(video) and video_id == "video1"
+    assert sessions.get("check") is None, "the finished session was not forgotten"
+
+
+def test_failed_chunk_is_retried_from_server_progress(server, video):
+    server.fail = {2: 503}
+    video_id = youtube_upload.upload_video(FakeYouTube(server.url), video, METADATA)
+    assert server.status_queries >= 1
+    assert server.sessions["/session/1"] == read(video) and video_id == "video1"
+
+
+def test_expired_session_starts_over(server, video, sessions):
+    sessions.set("check", {"uri": server.url + "/session/expired", "signature": youtube_upload.file_signature(video)})
+    video_id = youtube_upload.upload_video(
+        FakeYouTube(server.url), video, METADATA, sessions=sessions, session_key="check"
+    )
+    assert server.sessions["/session/1"] == read(video) and video_id == "video1"
@@ -0,0 +1,164 @@
+import os
+import wave
+import subprocess
+from typing import Callable, List
+import numpy as np
+
+
+def as_int16(audio_data: np.ndarray) -> np.ndarray:
+    """
+    Return int16 PCM for audio read from a WAV file, converting float data in [-1, 1].
+    int16 input is returned unchanged (no copy).
+    """
+    if audio_data.dtype == np.int16:
+        return audio_data
+    return (np.clip(audio_data, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class WavSink:
+    """
+    Incremental int16 WAV writer. Frames are appended as they arrive and the
+    header is fixed up on close, so memory use doesn't depend on the output length.
+    The file is written under a temporary name and moved into place on close.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.sample_rate = None
+        self.frames_written = 0
+        self._tmp_path = f"{path}.partial"
+        self._wave = None
+
+    def open(self, sample_rate: int, channels: int = 1):
+        self.sample_rate = sample_rate
+        self._wave = wave.open(self._tmp_path, "wb")
+        self._wave.setnchannels(channels)
+        self._wave.setsampwidth(2)
+        self._wave.setframerate(sample_rate)
+
+    @property
+    def is_open(self) -> bool:
+        return self._wave is not None
+
+    def write(self, frames: np.ndarray):
+        """Append int16 frames (shape (N,) or (N, channels))."""
+        self._wave.writeframes(np.ascontiguousarray(frames, dtype="<i2"))
+        self.frames_written += frames.shape[0]
+
+    def close(self):
+        if self._wave is None:
+            return
+        self._wave.close()
+        self._wave = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard a partially written file."""
+        if self._wave is not None:
+            self._wave.close()
+            self._wave = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class FfmpegSink:
+    """
+    Streams int16 PCM into an ffmpeg process's stdin while it encodes.
+    `build_command(sample_rate, channels)` returns the ffmpeg argv; it must
+    read raw s16le audio from 'pipe:0'.
+    """
+    def __init__(self, build_command: Callable[[int, int], List[str]]):
+        self.build_command = build_command
+        self.sample_rate = None
+        self.frames_written = 0
+        self._process = None
+
+    def open(self, sample_rate: int, channels: int = 1):
+        self.sample_rate = sample_rate
+        self._process = subprocess.Popen(self.build_command(sample_rate, channels), stdin=subprocess.PIPE)
+
+    @property
+    def is_open(self) -> bool:
+        return self._process is not None
+
+    def write(self, frames: np.ndarray):
+        self._process.stdin.write(memoryview(np.ascontiguousarray(frames, dtype="<i2")).cast("B"))
+        self.frames_written += frames.shape[0]
+
+    def close(self):
+        """Finish the stream and wait for ffmpeg; raises CalledProcessError on failure."""
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.stdin.close()
+        returncode = process.wait()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, process.args)
+
+    def abort(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class TeeSink:
+    """
+    Forwards every call to several sinks, e.g. an FfmpegSink plus a WavSink
+    when the intermediate merged WAV should be kept.
+    """
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    @property
+    def frames_written(self) -> int:
+        return self.sinks[0].frames_written if self.sinks else 0
+
+    @property
+    def is_open(self) -> bool:
+        return any(sink.is_open for sink in self.sinks)
+
+    def open(self, sample_rate: int, channels: int = 1):
+        for sink in self.sinks:
+            sink.open(sample_rate, channels)
+
+    def write(self, frames: np.ndarray):
+        for sink in self.sinks:
+            sink.write(frames)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
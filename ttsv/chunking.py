@@ -0,0 +1,83 @@
+import re
+from typing import List
+import numpy as np
+
+# Split points, from the most to the least natural place to pause
+SENTENCE_END = re.compile(r"(?<=[.!?…])[\"'”»)]*\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+|\s+(?=[–—-]\s)")
+WORD_GAP = re.compile(r"\s+")
+
+
+def _split_at(text: str, pattern: re.Pattern) -> List[str]:
+    return [part for part in (piece.strip() for piece in pattern.split(text)) if part]
+
+
+def _chunk(text: str, max_chars: int, patterns) -> List[str]:
+    """
+    Chunks of at most `max_chars`, split at the coarsest boundary in `patterns`
+    that works. Whole pieces are packed together while they fit; a piece
+    that has to be split further never shares a chunk with its neighbours.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    if not patterns:
+        # A single "word" longer than the limit: cut it
+        return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
+
+    chunks, current = [], ""
+    for part in _split_at(text, patterns[0]):
+        if len(part) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_chunk(part, max_chars, patterns[1:]))
+            continue
+        candidate = f"{current} {part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Split a long line into chunks of at most `max_chars` characters, cutting at
+    sentence ends where possible, then at clause boundaries, then between
+    words; a word is only cut when it is longer than `max_chars` by itself.
+    Neighbouring sentences (or clauses, or words) are packed together while
+    they fit, so chunks are as long and as few as the limit allows.
+    """
+    text = text.strip()
+    return _chunk(text, max_chars, [SENTENCE_END, CLAUSE_END, WORD_GAP]) if text else []
+
+
+def crossfade_join(audios: List[np.ndarray], sample_rate: int, fade_ms: float) -> np.ndarray:
+    """
+    Concatenate float waveforms, overlapping each joint by `fade_ms` with a
+    linear crossfade instead of a hard cut. The fade is shortened when
+    a chunk is too short for it.
+    """
+    audios = [np.asarray(audio, dtype=np.float32).reshape(-1) for audio in audios]
+    audios = [audio for audio in audios if audio.size]
+    if not audios:
+        return np.array([], dtype=np.float32)
+
+    fade = int(sample_rate * fade_ms / 1000)
+    total = sum(audio.size for audio in audios)
+    out = np.empty(total, dtype=np.float32)
+    out[: audios[0].size] = audios[0]
+    position = audios[0].size
+    for audio in audios[1:]:
+        overlap = min(fade, position, audio.size)
+        if overlap:
+            fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            start = position - overlap
+            out[start:position] *= 1.0 - fade_in
+            out[start:position] += audio[:overlap] * fade_in
+        out[position : position + audio.size - overlap] = audio[overlap:]
+        position += audio.size - overlap
+    return out[:position]
@@ -0,0 +1,144 @@
+import os
+import threading
+from typing import Dict, Iterable, Optional
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+
+CLIP_STORE_NAME = "clips.pcm"
+
+
+def clip_store_path(output_dir: str, filename: str, lang: str) -> str:
+    """
+    Location of a language's packed clips: output/{filename}/{lang}/clips.pcm
+    """
+    return os.path.join(output_dir, filename, lang, CLIP_STORE_NAME)
+
+
+class ClipStore:
+    """
+    Packed alternative to one WAV file per line: every clip of a language is
+    appended to a single raw PCM file (int16, little-endian, mono) and the
+    manifest records each clip's sample offset and length, which serves as
+    the index. Reads are zero-copy slices of a memory map of the file.
+
+    The file only grows; clips replaced by a new synthesis stay behind until
+    `compact` rewrites the file with the clips still referenced.
+    """
+    _open_stores: Dict[str, "ClipStore"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+
+    @classmethod
+    def open(cls, path: str) -> "ClipStore":
+        """Shared store for `path`, so every reader reuses one memory map."""
+        key = os.path.abspath(path)
+        with cls._open_lock:
+            if key not in cls._open_stores:
+                cls._open_stores[key] = cls(path)
+            return cls._open_stores[key]
+
+    def append(self, int16_audio: np.ndarray) -> int:
+        """Append a clip and return its offset in samples."""
+        data = np.ascontiguousarray(int16_audio, dtype="<i2").reshape(-1)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                offset = f.tell() // 2
+                f.write(memoryview(data).cast("B"))
+        return offset
+
+    def read(self, offset: int, num_samples: int) -> np.ndarray:
+        """Clip at `offset` as a read-only view of the memory-mapped store (no copy)."""
+        end = offset + num_samples
+        with self._lock:
+            if self._map is None or self._map.shape[0] < end:
+                self._map = np.memmap(self.path, dtype="<i2", mode="r")  # remap after appends
+            clip_map = self._map
+        if clip_map.shape[0] < end:
+            raise ValueError(f"Clip {offset}+{num_samples} is beyond the end of {self.path}")
+        return clip_map[offset:end]
+
+    def size_samples(self) -> int:
+        try:
+            return os.path.getsize(self.path) // 2
+        except OSError:
+            return 0
+
+    def compact(self, entries: Iterable[dict]):
+        """
+        Rewrite the store with only the clips of `entries` (manifest records
+        referencing it), in order, and update their offsets in place.
+        """
+        entries = sorted(entries, key=lambda entry: entry["offset"])
+        tmp_path = f"{self.path}.tmp"
+        new_offsets, position = [], 0
+        with open(tmp_path, "wb") as f:
+            for entry in entries:
+                clip = self.read(entry["offset"], entry["samples"])
+                f.write(memoryview(np.ascontiguousarray(clip)).cast("B"))
+                new_offsets.append(position)
+                position += entry["samples"]
+        with self._lock:
+            os.replace(tmp_path, self.path)
+            self._map = None
+        for entry, offset in zip(entries, new_offsets):
+            entry["offset"] = offset
+
+
+def compact_if_wasteful(manifest, lang: str, max_waste: float = 0.5):
+    """
+    Compact a language's store when more than `max_waste` of it holds clips
+    the manifest no longer references (e.g. after edits were re-synthesized).
+    Call before `manifest.save()`, which persists the new offsets.
+    """
+    entries = [entry for entry in manifest.for_language(lang).values() if "store" in entry]
+    if not entries:
+        return
+    store = ClipStore.open(manifest.clip_path(entries[0]))
+    used = sum(entry["samples"] for entry in entries)
+    total = store.size_samples()
+    if total and (total - used) / total > max_waste:
+        store.compact(entries)
+        print(f"Compacted clip store {store.path}: {total * 2 / 1e6:.1f} MB -> {used * 2 / 1e6:.1f} MB")
+
+
+def load_clip(manifest, entry: dict):
+    """(sample_rate, int16 frames) of a manifest record, from its WAV or the packed store."""
+    if "store" in entry:
+        store = ClipStore.open(manifest.clip_path(entry))
+        return entry["sample_rate"], store.read(entry["offset"], entry["samples"])
+    from scipy.io.wavfile import read as read_wav
+    from ttsv.audio_stream import as_int16
+    sample_rate, audio_data = read_wav(manifest.clip_path(entry), mmap=True)
+    return sample_rate, as_int16(audio_data)
+
+
+def export_clips(manifest, langs: Optional[Iterable[str]] = None) -> int:
+    """
+    Write the classic per-line files for the manifest's clips:
+    {lang}/speech/{line}-{lang}-{duration_ms}.wav and the matching
+    {lang}/text/{line}-{lang}-{duration_ms}.txt. Returns the number of clips.
+    """
+    count = 0
+    for (line_num, lang), entry in sorted(manifest.entries.items(), key=lambda item: (item[0][1], item[0][0])):
+        if langs is not None and lang not in langs:
+            continue
+        duration_ms = int(entry["samples"] / entry["sample_rate"] * 1000)
+        base = f"{line_num}-{lang}-{duration_ms}"
+        speech_dir = os.path.join(manifest.base_dir, lang, "speech")
+        text_dir = os.path.join(manifest.base_dir, lang, "text")
+        os.makedirs(speech_dir, exist_ok=True)
+        os.makedirs(text_dir, exist_ok=True)
+        wav_path = os.path.join(speech_dir, f"{base}.wav")
+        # Never rewrite a WAV clip onto itself (it is read memory-mapped)
+        if os.path.abspath(wav_path) != os.path.abspath(manifest.clip_path(entry)):
+            sample_rate, audio = load_clip(manifest, entry)
+            write_wav(wav_path, sample_rate, np.asarray(audio))
+        with open(os.path.join(text_dir, f"{base}.txt"), "w", encoding="utf-8") as f:
+            f.write(entry["text"])
+        count += 1
+    return count
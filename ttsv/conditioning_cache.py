@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional
+import torch
+from zonosp.zonos.conditioning import phonemize
+
+# Serving phonemes swaps a module-level function, one conditioning at a time
+_phonemize_lock = threading.Lock()
+
+
+class ConditioningCache:
+    """
+    LRU cache for the TTS front end: espeak-ng phoneme sequences, keyed by text
+    and language, and the conditioning tensors returned by
+    `prepare_conditioning`, keyed per line by text, language and speaker.
+    Entries are dropped least recently used first once they take up more than
+    `max_bytes` of memory. An optional disk tier keeps entries across runs.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2, cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._bytes = 0
+        self.counters = {
+            "phoneme_hits": 0,
+            "phoneme_misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+        }
+        self._miss_seconds = 0.0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, language: str, speaker_fingerprint: str = "") -> str:
+        """Hash of everything the conditioning depends on."""
+        parts = [text, language, speaker_fingerprint or ""]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _recall(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _remember(self, key, value, size: int):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _disk_path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def phonemes(self, text: str, language: str) -> str:
+        """Return the espeak-ng phoneme string for `text`, phonemizing only on a miss."""
+        key = ("phonemes", text, language)
+        result = self._recall(key)
+        if result is not None:
+            self.counters["phoneme_hits"] += 1
+            return result
+
+        path = self._disk_path(self.make_key(text, language), ".phonemes") if self.cache_dir else None
+        if path and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                result = f.read()
+            self.counters["phoneme_hits"] += 1
+        else:
+            result = phonemize([text], [language])[0]
+            self.counters["phoneme_misses"] += 1
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(result)
+
+        self._remember(key, result, len(text.encode("utf-8")) + len(result.encode("utf-8")))
+        return result
+
+    @contextmanager
+    def serving_phonemes(self, module):
+        """
+        Make `module.phonemize` (the function Zonos' espeak conditioner calls)
+        answer from `phonemes`, so a line is phonemized once for its token
+        budget and its conditioning.
+        """
+        def cached_phonemize(texts, languages):
+            return [self.phonemes(text, language) for text, language in zip(texts, languages)]
+
+        with _phonemize_lock:
+            original = module.phonemize
+            module.phonemize = cached_phonemize
+            try:
+                yield
+            finally:
+                module.phonemize = original
+
+    def conditioning(self, key: str, build: Callable[[], torch.Tensor], device) -> torch.Tensor:
+        """
+        Return the conditioning tensor for `key`, calling `build()` only when it is
+        neither in memory nor on disk.
+        """
+        tensor = self._recall(("conditioning", key))
+        if tensor is not None:
+            self.counters["memory_hits"] += 1
+            return tensor
+
+        path = self._disk_path(key, ".cond.pt") if self.cache_dir else None
+        if path and os.path.isfile(path):
+            try:
+                tensor = torch.load(path, map_location=device)
+                self.counters["disk_hits"] += 1
+                self._remember(("conditioning", key), tensor, tensor.element_size() * tensor.nelement())
+                return tensor
+            except Exception as e:
+                print(f"WARNING: Could not load cached conditioning {path}: {e}")
+
+        start = time.perf_counter()
+        tensor = build()
+        self._miss_seconds += time.perf_counter() - start
+        self.counters["misses"] += 1
+        if path:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(tensor.detach().cpu(), tmp_path)
+            os.replace(tmp_path, path)
+        self._remember(("conditioning", key), tensor, tensor.element_size() * tensor.nelement())
+        return tensor
+
+    def summary(self) -> str:
+        """Human-readable hit/miss counters and an estimate of front-end time saved."""
+        c = self.counters
+        hits = c["memory_hits"] + c["disk_hits"]
+        avg_miss = self._miss_seconds / c["misses"] if c["misses"] else 0.0
+        return (
+            f"Conditioning cache: {c['memory_hits']} memory hits, {c['disk_hits']} disk hits, "
+            f"{c['misses']} misses (~{hits * avg_miss:.1f}s saved, {self._bytes / 1024 ** 2:.0f} MiB in memory); "
+            f"phonemes: {c['phoneme_hits']} hits, {c['phoneme_misses']} misses"
+        )
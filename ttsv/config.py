@@ -1,13 +1,26 @@
+import os
 import json
 
-# Load video_config.json
-VIDEO_CONFIG_PATH = "ttsv/video_config.json"
-with open(VIDEO_CONFIG_PATH, "r", encoding="utf-8") as file:
-    CHANNEL_METADATA = json.load(file)
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(PACKAGE_DIR)  # Checkout holding assets/ and cache/
+
+# Per-channel video metadata, loaded on first access to CHANNEL_METADATA
+VIDEO_CONFIG_PATH = os.path.join(PACKAGE_DIR, "video_config.json")
+_channel_metadata = None
+
+def __getattr__(name):
+    global _channel_metadata
+    if name == "CHANNEL_METADATA":
+        if _channel_metadata is None:
+            with open(VIDEO_CONFIG_PATH, "r", encoding="utf-8") as file:
+                _channel_metadata = json.load(file)
+        return _channel_metadata
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 FILENAME_TO_PROCESS = "Test"   
 CHANNEL_TO_UPLOAD=["de"]           # e.g. "my_filename"
 LANGUAGES_TO_PROCESS = CHANNEL_TO_UPLOAD + ["en"]
+CHANNEL_WORKERS = 4                      # Channels merged / encoded / uploaded concurrently (None = all at once)
 REPETITION_PATTERN_TEXT= {"es":{"es": ["", "es", "es", "en", "es"], "en": ["", "es", "es", "en", "es"]},"de":{"de": ["", "de", "en", "en", "de","de",""], "en": ["", "de", "de", "en", "de","","de"]},"ru":{"ru": ["", "ru", "ru", "en", "ru"], "en": ["", "ru", "ru", "en", "ru"]}}
 REPETITION_PATTERN_WAVE= [0,0,1,0,1,0,0]
 
@@ -17,6 +30,33 @@ OUTPUT_DIRECTORY = "output"
 OUTPUT_DIRECTORY_RAW = "output"              # Where you want WAVs + final merges
 MAX_CHARS_PER_LINE = 100                         # If you want chunking, adjust
 USE_CHUNKING = False 
+CHUNK_CROSSFADE_MS = 30                          # Crossfade between the chunks of a long line
+MODEL_PATH = "Zyphra/Zonos-v0.1-transformer"
+REFERENCE_AUDIO_PATH = os.path.join(PROJECT_DIR, "assets", "exampleaudio.mp3")  # Default speaker reference clip
+TTS_SEED = 421                                   # Base seed; every line derives its own from it
+TTS_BATCH_SIZE = 4                               # Lines synthesized per model.generate call (1 = one at a time)
+TTS_NUM_WORKERS = 1                              # >1 shards synthesis across CPU worker processes
+TTS_THREADS_PER_WORKER = None                    # torch threads per worker (None = cpu_count // workers)
+TTS_ACCELERATION = ["inference_mode"]            # Any of "inference_mode", "bf16", "int8", "compile" (ttsv/model.py)
+USE_TOKEN_BUDGET = True                          # Cap generation per line by its phoneme count instead of a flat 30s
+PHONEMES_PER_SECOND = {"default": 12.0}          # Speaking rate per language, e.g. {"de": 11.0, "en-us": 13.0}
+TOKEN_BUDGET_MARGIN = 1.6                        # Budget = MIN_SECONDS + MARGIN x phonemes / rate
+TOKEN_BUDGET_MIN_SECONDS = 1.0
+TOKEN_BUDGET_MAX_SECONDS = 30                    # Hard cap, Zonos' default limit
+TOKEN_BUDGET_RETRY_FACTOR = 2                    # A line cut off at its budget is retried with this much more
+WRITER_THREADS = 2                               # Background threads converting and writing synthesized clips
+WRITER_MAX_PENDING = 16                          # Clips queued for writing before synthesis waits
+CLIP_STORE = "wav"                               # "packed" = one clips.pcm per language instead of one WAV per line
+USE_SYNTHESIS_CACHE = True                       # Reuse previously synthesized lines across runs
+SYNTHESIS_CACHE_DIR = os.path.join(PROJECT_DIR, "cache", "synthesis")  # Content-addressed WAV cache
+SYNTHESIS_CACHE_MAX_BYTES = 2 * 1024 ** 3        # Evict least recently used entries above this size
+SPEAKER_EMBEDDING_DIR = os.path.join(PROJECT_DIR, "cache", "speakers")  # Persisted speaker embeddings (None to disable)
+REFERENCE_AUDIO_PATHS = {}                       # Per-language reference clips, e.g. {"de": "assets/speaker-de.mp3"}
+CONDITIONING_CACHE_MAX_BYTES = 256 * 1024 ** 2   # In-memory LRU budget for phonemes / per-line conditioning
+CONDITIONING_CACHE_DIR = None                    # Optional disk tier, e.g. "cache/conditioning"
+LOG_LEVEL = "INFO"                               # "DEBUG" also logs every synthesized line
+METRICS_FORMAT = None                            # "jsonl" (every observation) or "prometheus" (end-of-run summaries)
+METRICS_PATH = None                              # Defaults to output/{file}/metrics.jsonl or metrics.prom
 LANG_MODEL_MAP = {
     "de": {
         "model_name": "tts_models/de/thorsten/vits",
@@ -41,6 +81,29 @@ VIDEO_FPS = 24                           # Frames per second
 VIDEO_BACKGROUND_COLOR = (0, 0, 0)       # Background color in RGB (default is black)
 VIDEO_CODEC = "libx264"                  # Video codec
 AUDIO_CODEC = "aac"                      # Audio codec
+VIDEO_PRESET = "veryfast"                # x264 preset
+VIDEO_CRF = 28                           # x264 constant rate factor (lower = better quality, bigger file)
+VIDEO_ENCODING_PROFILE = "still"         # Key of VIDEO_ENCODING_PROFILES
+VIDEO_ENCODING_PROFILES = {
+    # Solid-color source at VIDEO_FPS with the encoder's default GOP
+    "default": {"fps": VIDEO_FPS, "gop": None, "tune": None},
+    # Static background: 1 fps, one keyframe every 5 minutes, still-image tuning
+    "still": {"fps": 1, "gop": 300, "tune": "stillimage"},
+    # Encode a single frame once and loop it with stream copy (no per-run video encoding)
+    "looped_frame": {"fps": 1, "gop": None, "tune": "stillimage", "loop_frame": True},
+}
+VIDEO_SEGMENTED_ENCODE = False           # Encode long videos as parallel segments joined with stream copy
+VIDEO_SEGMENT_SECONDS = 300              # Target segment length; cuts happen only at clip boundaries
+VIDEO_SEGMENT_WORKERS = None             # Concurrent ffmpeg processes (None = cpu_count)
+FUSED_MERGE_ENCODE = False               # Step 2 streams merged PCM straight into ffmpeg (step 3 becomes a no-op)
+KEEP_MERGED_WAV = True                   # In fused mode, also write the intermediate {file}-{channel}-merged.wav
+PIPELINE_QUEUE_SIZE = 32                 # --pipeline: clips waiting to be merged, per channel
+PIPELINE_PCM_QUEUE_SIZE = 64             # --pipeline: merged clips waiting for the encoder, per channel
+TTS_SERVER_URL = None                    # Delegate synthesis to a running --serve daemon, e.g. "http://127.0.0.1:8765"
+SERVER_ADDRESS = "http://127.0.0.1:8765" # Where --serve listens ("unix:///tmp/ttsv.sock" for a Unix socket)
+SERVER_MAX_BATCH = 8                     # Lines the server merges into one generate call
+SERVER_BATCH_WAIT_MS = 20                # How long a partial batch waits for concurrent requests
+SERVER_DATA_ROOT = None                  # Directory /process jobs may read and write under (None = working directory)
 
 
 YOUTUBE_TITLE = "10 German Sentences with French Translation and subtitles"
@@ -48,4 +111,8 @@ YOUTUBE_DESCRIPTION = "Because repetitions lead to progress"
 YOUTUBE_CATEGORY_ID = "22"  # See YouTube category list
 YOUTUBE_TAGS = ["tag1", "tag2"]
 YOUTUBE_PRIVACY_STATUS = "private"  # "public", "private", or "unlisted"
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Resumable upload chunk size (multiple of 256 KiB)
+UPLOAD_MAX_RETRIES = 8              # Retries per chunk / caption request on 5xx or connection errors
+UPLOAD_BACKOFF_MAX_SECONDS = 64     # Cap for exponential backoff between retries
+CAPTION_UPLOAD_WORKERS = 4          # Subtitle files uploaded concurrently per video
 
@@ -1,62 +1,328 @@
 import os
+import wave
+import shutil
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from ttsv.scheduler import run_channels
+from ttsv.metrics import metrics
 from ttsv.config import (
     FILENAME_TO_PROCESS,
     OUTPUT_DIRECTORY,
     CHANNEL_TO_UPLOAD,
     VIDEO_RESOLUTION,
-    VIDEO_FPS,
     VIDEO_BACKGROUND_COLOR,
     VIDEO_CODEC,
     AUDIO_CODEC,
+    VIDEO_PRESET,
+    VIDEO_CRF,
+    VIDEO_ENCODING_PROFILE,
+    VIDEO_ENCODING_PROFILES,
+    VIDEO_SEGMENTED_ENCODE,
+    VIDEO_SEGMENT_SECONDS,
+    VIDEO_SEGMENT_WORKERS,
 )
 
-def create_black_videos_with_audio():
+AAC_FRAME = 1024             # Samples per AAC packet
+AAC_OVERLAP = 2 * AAC_FRAME  # Context encoded past both ends of an audio segment, then dropped
+
+def merged_video_path(channel):
     """
-    Creates black background videos with merged audio for each channel in CHANNEL_TO_UPLOAD.
+    Path of the final video for a channel (e.g. "Pizza-es.mp4").
+    """
+    return os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel}.mp4")
+
+def background_source(fps):
+    """
+    lavfi source for the solid background at `fps` frames per second.
+    """
+    # Convert background color tuple to ffmpeg hex format (e.g., black = 0x000000)
+    color_r, color_g, color_b = VIDEO_BACKGROUND_COLOR
+    color_hex = "0x{:02x}{:02x}{:02x}".format(color_r, color_g, color_b)
+    resolution = f"{VIDEO_RESOLUTION[0]}x{VIDEO_RESOLUTION[1]}"
+    return f'color=c={color_hex}:s={resolution}:r={fps}'
+
+def video_encoder_args(settings):
+    """
+    Encoder options for a profile: codec, preset, CRF, GOP length and tuning.
     """
-    for channel in CHANNEL_TO_UPLOAD:
-        # Paths for this channel
-        merged_audio_path = os.path.join(
-            OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, 
-            f"{FILENAME_TO_PROCESS}-{channel}-merged.wav"
-        )
-        merged_video_path = os.path.join(
-            OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, 
-            f"{FILENAME_TO_PROCESS}-{channel}.mp4"  # ✅ Clean name (e.g., "Pizza-es.mp4")
-        )
-        if not os.path.isfile(merged_audio_path):
-            print(f"ERROR: Merged audio file for channel '{channel}' not found at '{merged_audio_path}'. Skipping.")
-            continue
+    args = ['-c:v', VIDEO_CODEC, '-preset', VIDEO_PRESET, '-crf', str(VIDEO_CRF)]
+    if settings.get("gop"):
+        args += ['-g', str(settings["gop"])]
+    if settings.get("tune"):
+        args += ['-tune', settings["tune"]]
+    return args + ['-vf', 'format=yuv420p']  # Ensure compatibility
 
+def ensure_loop_frame(settings):
+    """
+    Encode a single background frame (once per set of video settings) for the
+    'looped_frame' profile and return its path. Channels encoded concurrently
+    may both build it on a first run; each writes its own temporary file and
+    whichever finishes last replaces the (identical) frame.
+    """
+    key = "-".join(str(part) for part in (
+        VIDEO_RESOLUTION[0], VIDEO_RESOLUTION[1], *VIDEO_BACKGROUND_COLOR,
+        VIDEO_CODEC, VIDEO_PRESET, VIDEO_CRF, settings["fps"]
+    ))
+    frame_path = os.path.join(OUTPUT_DIRECTORY, f".background-{key}.mp4")
+    if not os.path.isfile(frame_path):
+        os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+        tmp_path = f"{frame_path}.{os.getpid()}-{threading.get_ident()}.partial.mp4"
         try:
-            # Convert background color tuple to ffmpeg hex format (e.g., black = 0x000000)
-            color_r, color_g, color_b = VIDEO_BACKGROUND_COLOR
-            color_hex = "0x{:02x}{:02x}{:02x}".format(color_r, color_g, color_b)
-            resolution = f"{VIDEO_RESOLUTION[0]}x{VIDEO_RESOLUTION[1]}"
-
-            # Build ffmpeg command (no subtitles)
-            ffmpeg_cmd = [
-                'ffmpeg',
-                '-y',  # Overwrite output
-                '-f', 'lavfi',
-                '-i', f'color=c={color_hex}:s={resolution}:r={VIDEO_FPS}',  # Black background
-                '-i', merged_audio_path,  # Audio input
-                '-shortest',  # End when audio ends
-                '-c:v', VIDEO_CODEC,
-                '-c:a', AUDIO_CODEC,
-                '-vf', 'format=yuv420p',  # Ensure compatibility
-                merged_video_path
-            ]
-
-            print(f"Creating video for channel '{channel}'...")
-            subprocess.run(ffmpeg_cmd, check=True)
-            print(f"Successfully created video: '{merged_video_path}'")
-
-        except subprocess.CalledProcessError as e:
-            print(f"ffmpeg command failed for channel '{channel}': {e}")
-        except Exception as e:
-            print(f"Unexpected error for channel '{channel}': {e}")
+            subprocess.run([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'lavfi', '-i', background_source(settings["fps"]),
+                '-frames:v', '1',
+                *video_encoder_args(settings),
+                tmp_path
+            ], check=True)
+            os.replace(tmp_path, frame_path)
+        except (OSError, subprocess.CalledProcessError):
+            if not os.path.isfile(frame_path):
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return frame_path
+
+def build_ffmpeg_command(audio_input_args, video_path, profile=VIDEO_ENCODING_PROFILE):
+    """
+    Build the ffmpeg command that puts `audio_input_args` (e.g. ['-i', 'merged.wav'])
+    over a solid background and writes `video_path`, using one of
+    VIDEO_ENCODING_PROFILES.
+    """
+    settings = VIDEO_ENCODING_PROFILES[profile]
+    if settings.get("loop_frame"):
+        video_input_args = ['-stream_loop', '-1', '-i', ensure_loop_frame(settings)]
+        video_args = ['-c:v', 'copy']
+    else:
+        video_input_args = ['-f', 'lavfi', '-i', background_source(settings["fps"])]  # Black background
+        video_args = video_encoder_args(settings)
+
+    # Build ffmpeg command (no subtitles)
+    return [
+        'ffmpeg',
+        '-y',  # Overwrite output
+        *video_input_args,
+        *audio_input_args,  # Audio input
+        '-map', '0:v:0', '-map', '1:a:0',
+        '-shortest',  # End when audio ends
+        *video_args,
+        '-c:a', AUDIO_CODEC,
+        video_path
+    ]
+
+def build_pcm_pipe_command(sample_rate, channels, video_path):
+    """
+    ffmpeg command that reads raw int16 PCM from stdin, for streaming the merge
+    stage straight into the encoder.
+    """
+    audio_input_args = ['-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+    return build_ffmpeg_command(audio_input_args, video_path)
+
+def create_black_video(channel):
+    """
+    Creates a black background video with the merged audio for one channel.
+    Returns True on success.
+    """
+    with metrics.timer("encode_seconds", channel=channel):
+        return _create_black_video(channel)
+
+def _create_black_video(channel):
+    # Paths for this channel
+    merged_audio_path = os.path.join(
+        OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, 
+        f"{FILENAME_TO_PROCESS}-{channel}-merged.wav"
+    )
+    video_path = merged_video_path(channel)
+    if not os.path.isfile(merged_audio_path):
+        print(f"ERROR: Merged audio file for channel '{channel}' not found at '{merged_audio_path}'. Skipping.")
+        return False
+
+    if VIDEO_SEGMENTED_ENCODE and not VIDEO_ENCODING_PROFILES[VIDEO_ENCODING_PROFILE].get("loop_frame"):
+        from ttsv.merge import load_timeline
+        timeline = load_timeline(channel)
+        if timeline is not None:
+            return create_black_video_segmented(channel, merged_audio_path, video_path, *timeline)
+        print(f"WARNING: No timeline for channel '{channel}'; encoding in one pass.")
+
+    try:
+        ffmpeg_cmd = build_ffmpeg_command(['-i', merged_audio_path], video_path)
+
+        print(f"Creating video for channel '{channel}'...")
+        subprocess.run(ffmpeg_cmd, check=True)
+        print(f"Successfully created video: '{video_path}'")
+        return True
+
+    except subprocess.CalledProcessError as e:
+        print(f"ffmpeg command failed for channel '{channel}': {e}")
+    except Exception as e:
+        print(f"Unexpected error for channel '{channel}': {e}")
+    return False
+
+def plan_segments(clip_end_samples, sample_rate, fps, segment_seconds):
+    """
+    Split the timeline into segments of roughly `segment_seconds`, cutting only at
+    clip boundaries snapped to the frame grid. Returns a list of frame counts.
+    """
+    cut_frames = []
+    last_cut = 0
+    for end_sample in clip_end_samples[:-1]:
+        frame = round(end_sample / sample_rate * fps)
+        if (frame - last_cut) / fps >= segment_seconds:
+            cut_frames.append(frame)
+            last_cut = frame
+    total_frames = max(1, -(-clip_end_samples[-1] * fps // sample_rate)) if clip_end_samples else 1
+    cut_frames.append(max(total_frames, last_cut + 1))
+
+    frames, start = [], 0
+    for cut in cut_frames:
+        frames.append(cut - start)
+        start = cut
+    return frames
+
+def plan_audio_segments(clip_end_samples, sample_rate, total_samples, segment_seconds):
+    """
+    Split the audio into (start, end) sample ranges of roughly `segment_seconds`,
+    cutting only at clip boundaries (usually pauses) snapped to the AAC packet
+    grid, so every cut falls between two packets.
+    """
+    cuts, last_cut = [], 0
+    for end_sample in clip_end_samples[:-1]:
+        cut = round(end_sample / AAC_FRAME) * AAC_FRAME
+        if (cut - last_cut) / sample_rate >= segment_seconds and cut < total_samples:
+            cuts.append(cut)
+            last_cut = cut
+    bounds = [0, *cuts, total_samples]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def audio_segment_command(merged_audio_path, segment_path, start, end, total_samples):
+    """
+    ffmpeg command encoding the samples [start, end) of the merged audio, plus
+    up to AAC_OVERLAP samples of context on either side, as raw ADTS packets.
+    """
+    first, last = max(0, start - AAC_OVERLAP), min(total_samples, end + AAC_OVERLAP)
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', merged_audio_path,
+        '-af', f'atrim=start_sample={first}:end_sample={last},asetpts=PTS-STARTPTS',
+        '-vn', '-c:a', AUDIO_CODEC, '-f', 'adts', segment_path
+    ]
+
+def adts_packets(data):
+    """Split an ADTS stream into its packets (one AAC_FRAME each)."""
+    packets, position = [], 0
+    while position + 7 <= len(data):
+        length = ((data[position + 3] & 0x03) << 11) | (data[position + 4] << 3) | (data[position + 5] >> 5)
+        packets.append(data[position : position + length])
+        position += length
+    return packets
+
+def join_audio_segments(segments, audio_path):
+    """
+    Join ADTS segments from `audio_segment_command`, given as (path, start,
+    end), into one stream, keeping from each only the packets of its own
+    [start, end) range (cuts lie on the packet grid). Packet k of a segment
+    holds the samples from (k - 1) * AAC_FRAME on, as the encoder's
+    first packet is priming. Dropping the priming and the leading context,
+    and letting the trailing context only shape the last kept packet, makes
+    the joined stream sample-aligned with a single-pass encode, without gaps
+    at the joints.
+    """
+    with open(audio_path, "wb") as out:
+        for segment_path, start, end in segments:
+            with open(segment_path, "rb") as f:
+                packets = adts_packets(f.read())
+            skip = 1 + (start - max(0, start - AAC_OVERLAP)) // AAC_FRAME
+            count = -(-(end - start) // AAC_FRAME)
+            out.write(b"".join(packets[skip : skip + count]))
+
+def run_ffmpeg_jobs(commands, max_workers):
+    """
+    Run ffmpeg commands concurrently (at most `max_workers` at a time);
+    raises CalledProcessError if any of them fails.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(subprocess.run, cmd, check=True) for cmd in commands]
+        for future in futures:
+            future.result()
+
+def create_black_video_segmented(channel, merged_audio_path, video_path, sample_rate, clip_end_samples):
+    """
+    Encode a channel's video and audio as segments split at clip boundaries, in
+    a bounded pool of ffmpeg processes, then join them with the concat demuxer
+    (stream copy).
+
+    Separately encoded AAC segments can't simply be concatenated: each starts
+    with encoder priming and would put a gap at every joint, drifting away
+    from the subtitles. Audio segments are therefore cut on the AAC packet
+    grid, encoded with overlapping context as raw ADTS packets and joined
+    packet by packet (see join_audio_segments), which keeps the audio
+    sample-aligned with a single-pass encode. Returns True on success.
+    """
+    settings = VIDEO_ENCODING_PROFILES[VIDEO_ENCODING_PROFILE]
+    fps = settings["fps"]
+    segment_frames = plan_segments(clip_end_samples, sample_rate, fps, VIDEO_SEGMENT_SECONDS)
+    with wave.open(merged_audio_path, "rb") as wf:
+        audio_rate, total_samples = wf.getframerate(), wf.getnframes()
+    audio_segments = plan_audio_segments(
+        [round(end * audio_rate / sample_rate) for end in clip_end_samples], audio_rate, total_samples,
+        VIDEO_SEGMENT_SECONDS
+    )
+    work_dir = os.path.join(os.path.dirname(video_path), f".segments-{channel}")
+    os.makedirs(work_dir, exist_ok=True)
+    max_workers = VIDEO_SEGMENT_WORKERS or os.cpu_count() or 1
+
+    try:
+        commands, segment_paths = [], []
+        for index, frames in enumerate(segment_frames):
+            segment_path = os.path.join(work_dir, f"segment-{index:04d}.mp4")
+            segment_paths.append(segment_path)
+            commands.append([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'lavfi', '-i', background_source(fps),
+                '-frames:v', str(frames),
+                *video_encoder_args(settings),
+                '-an', segment_path
+            ])
+        audio_parts = []
+        for index, (start, end) in enumerate(audio_segments):
+            audio_parts.append((os.path.join(work_dir, f"audio-{index:04d}.aac"), start, end))
+            commands.append(audio_segment_command(merged_audio_path, audio_parts[-1][0], start, end, total_samples))
+
+        print(f"Creating video for channel '{channel}' in {len(segment_paths)} video and "
+              f"{len(audio_segments)} audio segments ({max_workers} workers)...")
+        run_ffmpeg_jobs(commands, max_workers)
+
+        audio_path = os.path.join(work_dir, "audio.aac")
+        join_audio_segments(audio_parts, audio_path)
+        concat_list = os.path.join(work_dir, "segments.txt")
+        with open(concat_list, "w", encoding="utf-8") as f:
+            for segment_path in segment_paths:
+                f.write(f"file '{os.path.abspath(segment_path)}'\n")
+        subprocess.run([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', concat_list,
+            '-i', audio_path,
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c', 'copy', '-shortest',
+            video_path
+        ], check=True)
+        print(f"Successfully created video: '{video_path}'")
+        return True
+
+    except subprocess.CalledProcessError as e:
+        print(f"ffmpeg command failed for channel '{channel}': {e}")
+    except Exception as e:
+        print(f"Unexpected error for channel '{channel}': {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return False
+
+def create_black_videos_with_audio():
+    """
+    Creates black background videos with merged audio for each channel in CHANNEL_TO_UPLOAD.
+    """
+    run_channels(create_black_video, CHANNEL_TO_UPLOAD, label="Video")
 
 if __name__ == "__main__":
     create_black_videos_with_audio()
\ No newline at end of file
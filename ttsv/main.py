@@ -1,8 +1,8 @@
+import os
 import argparse
-from ttsv.process_file import process_input_texts
-from ttsv.merge import create_merge_files
-from ttsv.generate_video import create_black_videos_with_audio
-from ttsv.youtube_upload import upload_video_to_channels
+from ttsv import config
+from ttsv.metrics import configure_logging, metrics, profiled
+from ttsv.step_runner import StepRunner, build_units, state_path
 
 def main():
     parser = argparse.ArgumentParser(description="Run the TTS video generation pipeline.")
@@ -10,6 +10,32 @@ def main():
                         help="Run only a specific step (0-4).")
     parser.add_argument("--from-step", type=int, choices=range(0, 5), 
                         help="Run from a specific step onward (0-4).")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print which steps, languages and channels would run, then exit.")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild everything, ignoring recorded fingerprints.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap steps 1-3: merge and encode each channel while lines are still "
+                             "being synthesized.")
+    parser.add_argument("--acceleration", type=lambda value: [mode for mode in value.split(",") if mode],
+                        default=config.TTS_ACCELERATION,
+                        help="Comma-separated model acceleration modes: inference_mode, bf16, int8, compile.")
+    parser.add_argument("--serve", nargs="?", const=config.SERVER_ADDRESS, metavar="ADDRESS",
+                        help="Keep the model loaded and serve synthesis requests (default address: SERVER_ADDRESS).")
+    parser.add_argument("--server-url", default=config.TTS_SERVER_URL,
+                        help="Delegate synthesis to a running --serve daemon instead of loading the model.")
+    parser.add_argument("--export-clips", action="store_true",
+                        help="Write every clip of the manifest as {lang}/speech/*.wav plus text files, then exit.")
+    parser.add_argument("--log-level", default=config.LOG_LEVEL,
+                        help="Logging verbosity (DEBUG, INFO, WARNING, ...).")
+    parser.add_argument("--metrics", choices=["jsonl", "prometheus"], default=config.METRICS_FORMAT,
+                        help="Write per-stage metrics as JSON lines or Prometheus text.")
+    parser.add_argument("--metrics-path", default=config.METRICS_PATH,
+                        help="Metrics output file (default: output/{file}/metrics.jsonl or .prom).")
+    parser.add_argument("--profile", choices=["cprofile", "torch"],
+                        help="Capture a cProfile or torch profiler trace of the run.")
+    parser.add_argument("--profile-output",
+                        help="Profile output file (default: output/{file}/profile.prof or .json).")
 
     args = parser.parse_args()
 
@@ -17,59 +43,84 @@ def main():
         print("Error: You cannot specify both --step and --from-step at the same time.")
         return
 
+    configure_logging(args.log_level)
+    # Step 1 fingerprints read the acceleration modes from config
+    config.TTS_ACCELERATION = args.acceleration
+    document_dir = os.path.join(config.OUTPUT_DIRECTORY, config.FILENAME_TO_PROCESS)
+    if args.metrics:
+        extension = "jsonl" if args.metrics == "jsonl" else "prom"
+        metrics.configure(args.metrics, args.metrics_path or os.path.join(document_dir, f"metrics.{extension}"))
+    profile_output = args.profile_output or os.path.join(
+        document_dir, "profile.prof" if args.profile == "cprofile" else "profile.json"
+    )
+
     # Step functions
     def step_0():
         from ttsv.model import ZonosTTS
+        from ttsv.config import MODEL_PATH, REFERENCE_AUDIO_PATH, REFERENCE_AUDIO_PATHS, TTS_SEED
         print("[Step 0] Initializing model...")
-        return ZonosTTS(model_path="Zyphra/Zonos-v0.1-transformer",
-                        reference_audio_path="assets/exampleaudio.mp3")
-
-    def step_1(model):
-        print("[Step 1] Processing input texts...")
-        process_input_texts(input_dir="text_input", filename="Test", model=model)
-
-    def step_2():
-        print("[Step 2] Merging output files...")
-        create_merge_files()
-
-    def step_3():
-        print("[Step 3] Generating black video with audio...")
-        create_black_videos_with_audio()
-
-    def step_4():
-        print("[Step 4] Uploading video to YouTube...")
-        upload_video_to_channels()
-
-    # Handling the step logic
-    steps = {
-        0: step_0,
-        1: step_1,  # Requires model
-        2: step_2,
-        3: step_3,
-        4: step_4
-    }
-
-    # Run a single step if --step is provided
+        return ZonosTTS(model_path=MODEL_PATH,
+                        reference_audio_path=REFERENCE_AUDIO_PATH,
+                        reference_audio_paths=REFERENCE_AUDIO_PATHS,
+                        seed=TTS_SEED,
+                        acceleration=args.acceleration)
+
+    # The model is only loaded once a step 1 unit actually needs to run
+    model = None
+    def get_model():
+        nonlocal model
+        if model is None and args.server_url:
+            from ttsv.server import RemoteTTS
+            model = RemoteTTS(args.server_url)
+        if model is None:
+            model = step_0()
+        return model
+
+    if args.step == 0:
+        step_0()
+        return
+
+    if args.serve:
+        from ttsv.server import serve
+        serve(step_0(), args.serve)
+        return
+
+    if args.export_clips:
+        from ttsv.manifest import Manifest, manifest_path
+        from ttsv.clip_store import export_clips
+        manifest = Manifest.load(manifest_path(config.OUTPUT_DIRECTORY, config.FILENAME_TO_PROCESS))
+        count = export_clips(manifest)
+        print(f"Exported {count} clips to {manifest.base_dir}")
+        return
+
+    # Steps to run: a single one, or everything from a given step onward
     if args.step is not None:
-        if args.step == 1:
-            model = step_0()  # Initialize model before step 1
-            step_1(model)
-        else:
-            steps[args.step]()  # Run only the requested step
+        steps = [args.step]
+    else:
+        start_step = args.from_step if args.from_step is not None else 0
+        steps = list(range(max(start_step, 1), 5))
+
+    runner = StepRunner(state_path(), force=args.force)
+    units = build_units(steps, get_model)
+
+    if args.plan:
+        print("Plan:")
+        runner.print_plan(units)
         return
 
-    # Run from a specific step onward
-    start_step = args.from_step if args.from_step is not None else 0
+    with profiled(args.profile, profile_output):
+        if args.pipeline:
+            if {1, 2, 3} <= set(steps):
+                from ttsv.pipeline import run_pipeline_units
+                run_pipeline_units(runner, [unit for unit in units if unit.step <= 3], get_model)
+                units = [unit for unit in units if unit.step > 3]
+            else:
+                print("WARNING: --pipeline needs steps 1-3; running the selected steps one after another.")
 
-    model = None
-    if start_step == 0 or start_step == 1:
-        model = step_0()
-
-    for step in range(start_step, 5):
-        if step == 1:
-            step_1(model)
-        else:
-            steps[step]()
+        runner.run(units)
+
+    metrics.flush()
+    metrics.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+import os
+import json
+import threading
+from typing import Dict, Iterable, Optional
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def manifest_path(output_dir: str, filename: str) -> str:
+    """
+    Location of the manifest for a document: output/{filename}/manifest.jsonl
+    """
+    return os.path.join(output_dir, filename, MANIFEST_NAME)
+
+
+class Manifest:
+    """
+    Per-document index of synthesized lines, stored as JSON lines with one
+    record per (line, language): text, exact sample count, sample rate and
+    clip location (a WAV file, or an offset into the language's packed clip
+    store). Clip paths are stored relative to the manifest directory.
+
+    Records are appended as lines are written, so a crashed run keeps what it
+    finished; when a (line, lang) pair appears more than once the last record
+    wins. `save()` rewrites the file compactly.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.base_dir = os.path.dirname(path)
+        self.entries: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()  # clips are recorded from writer threads
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        manifest = cls(path)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for raw in f:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+                    try:
+                        entry = json.loads(raw)
+                    except json.JSONDecodeError:
+                        continue  # e.g. a truncated last line after a crash
+                    manifest.entries[(entry["line"], entry["lang"])] = entry
+        return manifest
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def add(self, line_num: int, lang: str, text: str, num_samples: int, sample_rate: int,
+            wav_path: Optional[str] = None, store_path: Optional[str] = None, offset: Optional[int] = None,
+            key: Optional[str] = None):
+        """
+        Record a clip and append it to the manifest file. The clip is either
+        its own WAV file (`wav_path`) or a slice of a packed clip store
+        (`store_path` and sample `offset`, see ttsv.clip_store). `key` is the
+        clip's synthesis cache key, if any.
+        """
+        entry = {
+            "line": line_num,
+            "lang": lang,
+            "text": text,
+            "samples": int(num_samples),
+            "sample_rate": int(sample_rate),
+        }
+        if store_path is not None:
+            entry["store"] = os.path.relpath(store_path, self.base_dir)
+            entry["offset"] = int(offset)
+        else:
+            entry["wav"] = os.path.relpath(wav_path, self.base_dir)
+        if key is not None:
+            entry["key"] = key
+        with self._lock:
+            self.entries[(line_num, lang)] = entry
+            os.makedirs(self.base_dir, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def retain(self, lang: str, line_nums: Iterable[int]):
+        """Drop records for `lang` whose line is not in `line_nums`."""
+        keep = set(line_nums)
+        for key in [k for k in self.entries if k[1] == lang and k[0] not in keep]:
+            del self.entries[key]
+
+    def discard(self, line_num: int, lang: str) -> Optional[dict]:
+        """Drop the record of a (line, lang) pair, returning it if there was one."""
+        with self._lock:
+            return self.entries.pop((line_num, lang), None)
+
+    def save(self):
+        """Rewrite the manifest with one record per (line, lang), sorted."""
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key in sorted(self.entries, key=lambda k: (k[1], k[0])):
+                f.write(json.dumps(self.entries[key], ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def clip_path(self, entry: dict) -> str:
+        """Absolute-or-CWD-relative path of an entry's WAV file or packed clip store."""
+        return os.path.join(self.base_dir, entry["store"] if "store" in entry else entry["wav"])
+
+    def get(self, line_num: int, lang: str) -> Optional[dict]:
+        return self.entries.get((line_num, lang))
+
+    def for_language(self, lang: str) -> Dict[int, dict]:
+        """Map line number -> record for one language."""
+        return {line: entry for (line, entry_lang), entry in self.entries.items() if entry_lang == lang}
@@ -1,19 +1,58 @@
 import os
-import numpy as np
-from scipy.io.wavfile import read as read_wav, write as write_wav
+import json
+from scipy.io.wavfile import read as read_wav
 from ttsv.config import (
     CHANNEL_TO_UPLOAD,
     OUTPUT_DIRECTORY,
     FILENAME_TO_PROCESS,
     REPETITION_PATTERN_WAVE,
     REPETITION_PATTERN_TEXT,
+    FUSED_MERGE_ENCODE,
+    KEEP_MERGED_WAV,
 )
 from ttsv.utils import format_timestamp, parse_generated_filename
+from ttsv.audio_stream import WavSink, FfmpegSink, TeeSink, as_int16
+from ttsv.manifest import Manifest, manifest_path
+from ttsv.clip_store import load_clip
+from ttsv.scheduler import run_channels
+from ttsv.metrics import metrics
 
 def gather_files(channel_lang):
     """
-    Gather WAV and TXT files for a given channel language.
-    Returns a dictionary mapping line numbers to file info.
+    Gather clips for a given channel language and English from the document
+    manifest. Returns a dictionary mapping (line number, lang) to file info.
+    Falls back to scanning the speech/text directories for outputs written
+    before the manifest existed.
+    """
+    manifest = Manifest.load(manifest_path(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS))
+    if not manifest.exists():
+        return gather_legacy_files(channel_lang)
+
+    file_map = {}
+    for lang in [channel_lang, "en"]:
+        entries = manifest.for_language(lang)
+        if not entries:
+            print(f"WARNING: No manifest entries for language '{lang}' in '{manifest.path}'. Skipping.")
+            continue
+        for line_num, entry in entries.items():
+            file_map[(line_num, lang)] = clip_info(manifest, entry)
+    return file_map
+
+def clip_info(manifest, entry):
+    """File info for a manifest record, as used by the merge and subtitle steps."""
+    return {
+        "manifest": manifest,
+        "entry": entry,
+        "text": entry["text"],
+        "num_samples": entry["samples"],
+        "sample_rate": entry["sample_rate"],
+        "duration_ms": int(entry["samples"] / entry["sample_rate"] * 1000),
+    }
+
+def gather_legacy_files(channel_lang):
+    """
+    Gather '{lineNum}-{lang}-{duration}' WAV and TXT files for a given channel
+    language by scanning the output directories.
     """
     file_map = {}
     for lang in [channel_lang, "en"]:
@@ -41,49 +80,90 @@ def gather_files(channel_lang):
             }
     return file_map
 
-def merge_wav_files(file_map, channel_lang, max_line_num):
+def read_line_text(info):
     """
-    Merge WAV files for a given channel language and English.
-    Returns merged audio, sample rate, and timestamps (grouped by line).
+    Text of a clip: from the manifest record, or from the legacy per-line TXT file.
     """
-    merged_audio, sample_rate = None, None
-    timestamps = []  # List of lists: [[(start1, end1), ...], ...]
-    elapsed_time_sec = 0.0
+    if "text" in info:
+        return info["text"]
+    if os.path.isfile(info["txt_path"]):
+        with open(info["txt_path"], "r", encoding="utf-8") as tf:
+            info["text"] = tf.read().strip()  # read each legacy file only once
+        return info["text"]
+    return None
 
-    for line_num in range(1, max_line_num + 1):
+class StreamMerger:
+    """
+    Incremental form of the merge: `add_line(clips)` appends one line's clips
+    to `sink` following REPETITION_PATTERN_WAVE, so audio can be assembled as
+    lines become available. `clips` maps a language to (sample_rate, int16
+    frames). Timestamps come from the exact number of samples written; if a
+    `boundaries` list is given, the end sample of every clip is appended to it.
+    """
+    def __init__(self, channel_lang, sink, boundaries=None):
+        self.channel_lang = channel_lang
+        self.sink = sink
+        self.boundaries = boundaries
+        self.sample_rate = None
+        self.timestamps = []  # List of lists: [[(start1, end1), ...], ...]
+        self.elapsed_samples = 0
+
+    def add_line(self, clips):
         line_timestamps = []
         for wave_entry in REPETITION_PATTERN_WAVE:
-            lang = channel_lang if wave_entry == 0 else "en"
-            info = file_map.get((line_num, lang))
-            if not info:
+            lang = self.channel_lang if wave_entry == 0 else "en"
+            if lang not in clips:
                 continue
+            sr, audio_data = clips[lang]
 
-            # Read WAV file
-            sr, audio_data = read_wav(info["wav_path"])
-            if audio_data.dtype == np.int16:
-                audio_data = audio_data.astype(np.float32) / 32767.0
-
-            if sample_rate is None:
-                sample_rate = sr
-            elif sr != sample_rate:
+            if self.sample_rate is None:
+                self.sample_rate = sr
+                self.sink.open(sr, 1 if audio_data.ndim == 1 else audio_data.shape[1])
+            elif sr != self.sample_rate:
                 continue
 
-            merged_audio = audio_data if merged_audio is None else np.concatenate([merged_audio, audio_data])
+            self.sink.write(audio_data)
 
             # Record timestamps (in seconds as floats)
-            start_ts = elapsed_time_sec
-            end_ts = start_ts + info["duration_ms"] / 1000.0
+            start_ts = self.elapsed_samples / self.sample_rate
+            self.elapsed_samples += audio_data.shape[0]
+            end_ts = self.elapsed_samples / self.sample_rate
+            if self.boundaries is not None:
+                self.boundaries.append(self.elapsed_samples)
             line_timestamps.append((start_ts, end_ts))
-            elapsed_time_sec = end_ts
 
         # Format timestamps for this line
-        formatted_line_timestamps = [
+        self.timestamps.append([
             (format_timestamp(start), format_timestamp(end))
             for start, end in line_timestamps
-        ]
-        timestamps.append(formatted_line_timestamps)
+        ])
 
-    return merged_audio, sample_rate, timestamps
+def read_clip(info):
+    """
+    (sample_rate, int16 frames) of a clip, memory-mapped: a slice of the packed
+    clip store or the clip's WAV file.
+    """
+    if "entry" in info:
+        return load_clip(info["manifest"], info["entry"])
+    sr, audio_data = read_wav(info["wav_path"], mmap=True)
+    return sr, as_int16(audio_data)
+
+def merge_wav_files(file_map, channel_lang, max_line_num, sink, boundaries=None):
+    """
+    Stream WAV files for a given channel language and English into `sink`
+    (e.g. a WavSink), one clip at a time, following REPETITION_PATTERN_WAVE.
+    Each clip is read once per line, however often the pattern repeats it.
+    Returns sample rate and timestamps (grouped by line).
+    """
+    merger = StreamMerger(channel_lang, sink, boundaries)
+    for line_num in range(1, max_line_num + 1):
+        clips = {}  # lang -> (sr, int16 frames)
+        for lang in (channel_lang, "en"):
+            info = file_map.get((line_num, lang))
+            if info and lang not in clips:
+                clips[lang] = read_clip(info)
+        merger.add_line(clips)
+    return merger.sample_rate, merger.timestamps
 
 def create_subtitles(file_map, channel_lang, max_line_num, timestamps):
     """
@@ -109,10 +189,10 @@ def create_subtitles(file_map, channel_lang, max_line_num, timestamps):
                     subtitles[lang].append(f"{start_ts},{end_ts}\n\n")
                 else:
                     info = file_map.get((line_num, text_lang))
-                    if info and os.path.isfile(info["txt_path"]):
-                        with open(info["txt_path"], "r", encoding="utf-8") as tf:
-                            # Add timestamp, text, and blank line
-                            subtitles[lang].append(f"{start_ts},{end_ts}\n{tf.read().strip()}\n\n")
+                    text = read_line_text(info) if info else None
+                    if text is not None:
+                        # Add timestamp, text, and blank line
+                        subtitles[lang].append(f"{start_ts},{end_ts}\n{text}\n\n")
                     else:
                         # Add timestamp with empty text and blank line
                         subtitles[lang].append(f"{start_ts},{end_ts}\n\n")
@@ -140,46 +220,105 @@ def generate_sbv_files(channel_lang, subtitle_langs):
         else:
             print(f"WARNING: Source TXT file not found for SBV generation: {txt_path}")
 
-def save_outputs(channel_lang, merged_audio, sample_rate, subtitles):
+def merged_wav_path(channel_lang):
+    """
+    Path of the merged WAV for a given channel language.
+    """
+    return os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel_lang}-merged.wav")
+
+def timeline_path(channel_lang):
     """
-    Save merged WAV and subtitle files for a given channel language.
+    Path of the clip timeline (sample rate + clip end samples) for a channel.
     """
-    # Save merged WAV
-    merged_wav_output = os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel_lang}-merged.wav")
-    if merged_audio is not None and sample_rate is not None:
-        write_wav(merged_wav_output, sample_rate, (merged_audio * 32767).astype(np.int16))
-        print(f"  Merged audio saved to: {merged_wav_output}")
+    return os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel_lang}-timeline.json")
 
+def save_timeline(channel_lang, sample_rate, boundaries):
+    """
+    Save the clip boundaries of the merged audio, used to split encoding into segments.
+    """
+    with open(timeline_path(channel_lang), "w", encoding="utf-8") as f:
+        json.dump({"sample_rate": sample_rate, "clip_end_samples": boundaries}, f)
+
+def load_timeline(channel_lang):
+    """
+    Return (sample_rate, clip end samples) for a channel, or None if not merged yet.
+    """
+    path = timeline_path(channel_lang)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        timeline = json.load(f)
+    return timeline["sample_rate"], timeline["clip_end_samples"]
+
+def save_outputs(channel_lang, subtitles):
+    """
+    Save subtitle files for a given channel language.
+    """
     # Save subtitles
     for lang, text in subtitles.items():
-        subtitle_path = os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel_lang}-{lang}.txt")
+        subtitle_path = os.path.join(
+            OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, f"{FILENAME_TO_PROCESS}-{channel_lang}-{lang}.txt"
+        )
         with open(subtitle_path, "w", encoding="utf-8") as f:
             f.write("".join(text))
         print(f"  Subtitles saved to: {subtitle_path}")
     generate_sbv_files(channel_lang, subtitles.keys())
 
 
-def process_channel(channel_lang):
+def open_merge_sink(channel_lang, encode_video, keep_wav):
+    """
+    Sink for a channel's merged audio: the merged WAV, the ffmpeg encoder, or both.
+    """
+    if not encode_video:
+        return WavSink(merged_wav_path(channel_lang))
+
+    from ttsv.generate_video import build_pcm_pipe_command, merged_video_path
+    video_path = merged_video_path(channel_lang)
+    encoder = FfmpegSink(lambda sample_rate, channels: build_pcm_pipe_command(sample_rate, channels, video_path))
+    if keep_wav:
+        return TeeSink(encoder, WavSink(merged_wav_path(channel_lang)))
+    return encoder
+
+def process_channel(channel_lang, encode_video=FUSED_MERGE_ENCODE, keep_wav=KEEP_MERGED_WAV):
     """
     Process a single channel: merge WAV files and create subtitles.
+    With `encode_video`, the merged audio is piped into ffmpeg as it is
+    produced, and the merged WAV is only written if `keep_wav` is set.
+    Returns True on success.
     """
     file_map = gather_files(channel_lang)
     max_line_num = max((k[0] for k in file_map.keys()), default=0)
     if max_line_num == 0:
         print(f"ERROR: No valid audio files found for channel '{channel_lang}'.")
-        return
+        return False
 
-    merged_audio, sample_rate, timestamps = merge_wav_files(file_map, channel_lang, max_line_num)
+    boundaries = []
+    try:
+        with metrics.timer("merge_seconds", channel=channel_lang), \
+                open_merge_sink(channel_lang, encode_video, keep_wav) as sink:
+            sample_rate, timestamps = merge_wav_files(file_map, channel_lang, max_line_num, sink, boundaries)
+    except Exception as e:
+        print(f"ERROR: Merging audio for channel '{channel_lang}' failed: {e}")
+        return False
+    if sink.frames_written:
+        if encode_video:
+            print(f"  Video encoded while merging for channel '{channel_lang}'")
+        if keep_wav or not encode_video:
+            print(f"  Merged audio saved to: {merged_wav_path(channel_lang)}")
+    save_timeline(channel_lang, sample_rate, boundaries)
     subtitles = create_subtitles(file_map, channel_lang, max_line_num, timestamps)
-    save_outputs(channel_lang, merged_audio, sample_rate, subtitles)
+    save_outputs(channel_lang, subtitles)
+    return True
 
 def create_merge_files():
     """
     Process all channels in CHANNEL_TO_UPLOAD.
     """
-    for channel_lang in CHANNEL_TO_UPLOAD:
+    def run(channel_lang):
         print(f"Processing channel: {channel_lang}")
-        process_channel(channel_lang)
+        return process_channel(channel_lang)
+
+    run_channels(run, CHANNEL_TO_UPLOAD, label="Merge")
     print("Merging complete!")
 
 if __name__ == "__main__":
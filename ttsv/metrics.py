@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+log = logging.getLogger("ttsv")
+
+
+def configure_logging(level: str = "INFO"):
+    """Set the verbosity of the 'ttsv' logger (DEBUG shows per-line synthesis details)."""
+    logging.basicConfig(format="%(message)s")
+    log.setLevel(level.upper())
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident set size of this process (or of its waited-for children, e.g. ffmpeg)."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class Metrics:
+    """
+    Thread-safe registry of timings and values, labelled by e.g. language or
+    channel. Every observation is kept as a summary (count, sum, min, max).
+
+    In 'jsonl' format each observation is also appended to `path` as it
+    happens; in 'prometheus' format `flush()` writes the summaries to `path`
+    in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self.format = None
+        self.path = None
+        self._lock = threading.Lock()
+        self._summaries = {}  # (name, labels) -> [count, sum, min, max]
+        self._file = None
+
+    def configure(self, format: Optional[str], path: Optional[str]):
+        if format not in (None, "jsonl", "prometheus"):
+            raise ValueError(f"Unknown metrics format '{format}' (expected 'jsonl' or 'prometheus')")
+        self.format = format
+        self.path = path
+        if format and path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = min(summary[2], value)
+                summary[3] = max(summary[3], value)
+            if self.format == "jsonl" and self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                record = {"time": round(time.time(), 3), "metric": name, "value": value, **labels}
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self, name: str, **labels):
+        """(count, sum, min, max) of a metric, or None if never observed."""
+        summary = self._summaries.get((name, tuple(sorted(labels.items()))))
+        return tuple(summary) if summary else None
+
+    def record_synthesis(self, lang: str, audio_lengths, sample_rate: int, stats: dict):
+        """
+        Record one synthesized batch: total and per-stage model time, token
+        usage, plus each line's latency (the batch time, apportioned by audio
+        length) and real-time factor (synthesis seconds per second of audio).
+        """
+        seconds = stats.get("seconds", 0.0)
+        self.observe("tts_batch_seconds", seconds, lang=lang)
+        for stage in ("conditioning", "generate", "decode"):
+            if stage in stats:
+                self.observe(f"tts_{stage}_seconds", stats[stage], lang=lang)
+        total_samples = sum(audio_lengths)
+        for num_samples in audio_lengths:
+            self.observe("tts_line_seconds", seconds * num_samples / max(total_samples, 1), lang=lang)
+            self.observe("tts_audio_seconds", num_samples / sample_rate, lang=lang)
+        if total_samples:
+            self.observe("tts_rtf", seconds / (total_samples / sample_rate), lang=lang)
+        if "tokens_generated" in stats:
+            # Wasted: steps spent on padding after a line ended and on cut-off attempts
+            self.observe("tts_tokens_used", stats["tokens_used"], lang=lang)
+            self.observe("tts_tokens_wasted", stats["tokens_generated"] - stats["tokens_used"], lang=lang)
+            self.observe("tts_token_retries", stats.get("token_retries", 0), lang=lang)
+
+    def flush(self):
+        """Record peak RSS and write out the configured output."""
+        for children in (False, True):
+            rss = peak_rss_bytes(children)
+            if rss:
+                self.observe("peak_rss_bytes", rss, process="children" if children else "self")
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.format == "prometheus" and self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus_text())
+                os.replace(tmp_path, self.path)
+        if self.format and self.path:
+            print(f"Metrics written to {self.path}")
+
+    def prometheus_text(self) -> str:
+        """Summaries as Prometheus summaries (_count, _sum) plus a _max gauge each."""
+        lines = []
+        by_name = {}
+        for (name, labels), summary in sorted(self._summaries.items()):
+            by_name.setdefault(f"ttsv_{name}", []).append((labels, summary))
+        for metric, series in by_name.items():
+            lines.append(f"# TYPE {metric} summary")
+            for labels, (count, total, _, _) in series:
+                suffix = _label_suffix(labels)
+                lines.append(f"{metric}_count{suffix} {count}")
+                lines.append(f"{metric}_sum{suffix} {total:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            for labels, (_, _, _, high) in series:
+                lines.append(f"{metric}_max{_label_suffix(labels)} {high:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        """Short human-readable summary of the recorded timings."""
+        if not self._summaries:
+            return
+        print("Metrics:")
+        for (name, labels), (count, total, low, high) in sorted(self._summaries.items()):
+            label_text = ", ".join(f"{key}={value}" for key, value in labels)
+            mean = total / count
+            print(f"  {name}{f' [{label_text}]' if label_text else ''}: n={count} mean={mean:.4g} "
+                  f"min={low:.4g} max={high:.4g}")
+
+
+def _label_suffix(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(kind: Optional[str], path: str):
+    """
+    Profile the block with cProfile (stats file for pstats/snakeviz) or the
+    torch profiler (Chrome trace); does nothing when `kind` is None.
+    """
+    if kind is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path}")
+    elif kind == "torch":
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with profile(activities=activities, record_shapes=True) as profiler:
+            yield
+        profiler.export_chrome_trace(path)
+        print(f"torch profiler trace written to {path}")
+    else:
+        raise ValueError(f"Unknown profiler '{kind}' (expected 'cprofile' or 'torch')")
@@ -1,51 +1,427 @@
+import re
+import sys
+import time
+import threading
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Iterable, List, Optional
 import torch
 import torchaudio
 import numpy as np
 from zonosp.zonos.model import Zonos
 from zonosp.zonos.conditioning import make_cond_dict
 from zonosp.zonos.utils import DEFAULT_DEVICE as device
+from ttsv.config import (
+    SPEAKER_EMBEDDING_DIR,
+    CONDITIONING_CACHE_MAX_BYTES,
+    CONDITIONING_CACHE_DIR,
+    TTS_ACCELERATION,
+    USE_TOKEN_BUDGET,
+    PHONEMES_PER_SECOND,
+    TOKEN_BUDGET_MARGIN,
+    TOKEN_BUDGET_MIN_SECONDS,
+    TOKEN_BUDGET_MAX_SECONDS,
+    TOKEN_BUDGET_RETRY_FACTOR,
+)
+from ttsv.metrics import log
+from ttsv.speaker_store import SpeakerEmbeddingStore
+from ttsv.conditioning_cache import ConditioningCache
+
+ACCELERATION_MODES = ("inference_mode", "bf16", "int8", "compile")
+WARMUP_TEXT = "This sentence warms up the model."
+TOKENS_PER_SECOND = 86  # Zonos code frames per second of audio
+# Zonos' delay pattern drops a few frames at the end, so a line that ends
+# this close to max_new_tokens was cut off rather than finished.
+CUTOFF_SLACK = 16
+# Stress and length marks, punctuation and spaces in espeak output
+NON_PHONEME = re.compile(r"[\sˈˌːˑ.,;:!?¡¿'\"()«»“”„…–—-]")
+# Row-seeded sampling swaps a module-level function, one batch at a time
+_sampling_lock = threading.Lock()
+
+
+def _sampling_module():
+    """
+    The module Zonos samples tokens from. Zonos imports it as `zonos.sampling`,
+    which may be another module object than `zonosp.zonos.sampling` (see README).
+    """
+    sampler = getattr(sys.modules[Zonos.__module__], "sample_from_logits", None)
+    return sys.modules.get(getattr(sampler, "__module__", None) or "")
 
 
 class TTSModel:
     """
     A general-purpose TTS base class for Zonos. Loads a pre-trained model
     and creates a speaker embedding from a reference audio file.
+
+    Speaker embeddings are persisted in a SpeakerEmbeddingStore, so the
+    embedding model only runs the first time a reference clip is seen.
+    `reference_audio_paths` maps languages to their own reference clips.
+
+    `acceleration` selects inference speed-ups (default TTS_ACCELERATION):
+    "inference_mode" runs under torch.inference_mode, "bf16" autocasts
+    generation and decoding to bfloat16, "int8" dynamically quantizes the
+    backbone's linear layers (CPU only) and "compile" wraps the backbone in
+    torch.compile. bf16 and int8 change the audio slightly, so they are part
+    of `precision`, which the synthesis cache key includes.
+
+    With `per_row_seeds`, every line of a batch samples from its own
+    generator (see `_row_sampling`), so a line's audio depends on its seed
+    and not on the other lines it was batched with.
+
+    With USE_TOKEN_BUDGET, generation of each line is capped by
+    `token_budget` instead of Zonos' flat 30 seconds (see `_generate_codes`);
+    `token_stats` counts the tokens budgeted, generated and kept. The budget
+    changes the audio, so `token_budget_settings` is part of the synthesis
+    cache key too.
     """
     def __init__(
         self,
         model_path: str = "Zyphra/Zonos-v0.1-transformer",
         reference_audio_path: str = "assets/exampleaudio.mp3",
         use_device = device,
-        seed: int = 421
+        seed: int = 421,
+        reference_audio_paths: Optional[Dict[str, str]] = None,
+        speaker_store_dir: Optional[str] = SPEAKER_EMBEDDING_DIR,
+        acceleration: Optional[Iterable[str]] = None
     ):
+        self.acceleration = set(TTS_ACCELERATION if acceleration is None else acceleration)
+        unknown = self.acceleration - set(ACCELERATION_MODES)
+        if unknown:
+            raise ValueError(
+                f"Unknown acceleration mode(s) {sorted(unknown)} (expected {', '.join(ACCELERATION_MODES)})"
+            )
+        if {"bf16", "int8"} <= self.acceleration:
+            raise ValueError("Acceleration modes 'bf16' and 'int8' can't be combined")
         self.model_path = model_path
         self.use_device = use_device
         self.seed = seed
+        self.reference_audio_path = reference_audio_path
+        self.reference_audio_paths = dict(reference_audio_paths or {})
+        self.speaker_store = SpeakerEmbeddingStore(speaker_store_dir) if speaker_store_dir else None
+        self._speakers = {}  # reference audio path -> (embedding, fingerprint)
+        self.conditioning_cache = ConditioningCache(CONDITIONING_CACHE_MAX_BYTES, CONDITIONING_CACHE_DIR)
+        self._pad_row = None  # prefix conditioning of a phoneme pad token, see _padding_row
+        self.timings = {"conditioning": 0.0, "generate": 0.0, "decode": 0.0}  # cumulative seconds
+        self.token_stats = {"tokens_budget": 0, "tokens_generated": 0, "tokens_used": 0, "token_retries": 0}
         
         # Load pre-trained Zonos model
         self.model = Zonos.from_pretrained(self.model_path, device=self.use_device)
         
-        # Load reference audio & generate speaker embedding
-        wav, sampling_rate = torchaudio.load(reference_audio_path)
-        self.speaker = self.model.make_speaker_embedding(wav, sampling_rate)
+        # Load (or create) the default speaker embedding
+        self.speaker, self.speaker_fingerprint = self.load_speaker(reference_audio_path)
+
+        self._accelerate()
+
+    def _accelerate(self):
+        """
+        Apply the load-time acceleration modes, then run one warmup line so
+        quantized kernels and compiled graphs are ready before the first real
+        line; the warmup doesn't count towards `timings`.
+        """
+        if "int8" in self.acceleration:
+            if torch.device(self.use_device).type != "cpu":
+                print("WARNING: int8 dynamic quantization only runs on the CPU; skipping it.")
+                self.acceleration.discard("int8")
+            else:
+                torch.ao.quantization.quantize_dynamic(
+                    self.model.backbone, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                )
+        if "compile" in self.acceleration:
+            self.model.backbone = torch.compile(self.model.backbone, dynamic=True)
+
+        if self.acceleration & {"bf16", "int8", "compile"}:
+            self.generate_audio(WARMUP_TEXT)
+            self.timings = dict.fromkeys(self.timings, 0.0)
+            self.token_stats = dict.fromkeys(self.token_stats, 0)
+
+    @property
+    def precision(self) -> str:
+        """Numeric precision of generation: "float32", "bf16" or "int8"."""
+        return next((mode for mode in ("bf16", "int8") if mode in self.acceleration), "float32")
+
+    @property
+    def token_budget_settings(self) -> str:
+        """
+        The USE_TOKEN_BUDGET settings generation depends on, for the synthesis
+        cache key; empty without a budget (Zonos' flat limit).
+        """
+        if not USE_TOKEN_BUDGET:
+            return ""
+        rates = ",".join(f"{lang}={rate}" for lang, rate in sorted(PHONEMES_PER_SECOND.items()))
+        return (f"budget:{rates};{TOKEN_BUDGET_MARGIN};{TOKEN_BUDGET_MIN_SECONDS};"
+                f"{TOKEN_BUDGET_MAX_SECONDS};{TOKEN_BUDGET_RETRY_FACTOR}")
+
+    def _inference(self) -> ExitStack:
+        """Context for running the model: inference mode, if enabled."""
+        stack = ExitStack()
+        if "inference_mode" in self.acceleration:
+            stack.enter_context(torch.inference_mode())
+        return stack
+
+    def _autocast(self) -> ExitStack:
+        """
+        Context for generate and decode: bfloat16 autocast, if enabled. The
+        conditioning stays in float32, so cached conditioning is shared
+        across precisions.
+        """
+        stack = ExitStack()
+        if "bf16" in self.acceleration:
+            stack.enter_context(torch.autocast(device_type=torch.device(self.use_device).type, dtype=torch.bfloat16))
+        return stack
+
+    def load_speaker(self, reference_audio_path: str):
+        """
+        Return (embedding, fingerprint) for a reference clip. The fingerprint is the
+        hash of the clip and model id; the embedding comes from memory, then the
+        on-disk store, and is only computed from the audio as a last resort.
+        """
+        if reference_audio_path in self._speakers:
+            return self._speakers[reference_audio_path]
+
+        fingerprint = SpeakerEmbeddingStore.make_key(reference_audio_path, self.model_path)
+        speaker = self.speaker_store.load(fingerprint, self.use_device) if self.speaker_store else None
+        if speaker is None:
+            wav, sampling_rate = torchaudio.load(reference_audio_path)
+            speaker = self.model.make_speaker_embedding(wav, sampling_rate)
+            if self.speaker_store:
+                self.speaker_store.save(fingerprint, speaker)
+
+        self._speakers[reference_audio_path] = (speaker, fingerprint)
+        return speaker, fingerprint
+
+    def use_speaker_for(self, language: str):
+        """
+        Switch to the reference clip configured for `language`, or the default clip.
+        """
+        reference_audio_path = self.reference_audio_paths.get(language, self.reference_audio_path)
+        self.speaker, self.speaker_fingerprint = self.load_speaker(reference_audio_path)
+
+    @property
+    def per_row_seeds(self) -> bool:
+        """Whether `generate_audio_batch` can seed every line separately."""
+        return callable(getattr(_sampling_module(), "multinomial", None))
+
+    @contextmanager
+    def _row_sampling(self, seeds: Optional[List[int]]):
+        """
+        Draw each batch row's sampling noise from a generator seeded with
+        `seeds[row]`. Zonos samples tokens with `sampling.multinomial`
+        (exponential noise from the global RNG); for the duration of the block
+        it is replaced by the same computation on per-row generators. Does
+        nothing without `seeds` or `per_row_seeds`.
+        """
+        if seeds is None or not self.per_row_seeds:
+            yield
+            return
+        generators = [torch.Generator(device=self.use_device).manual_seed(int(seed)) for seed in seeds]
+        sampling = _sampling_module()
+        original = sampling.multinomial
+
+        def multinomial(input, num_samples, replacement=False, *, generator=None):
+            if num_samples != 1 or input.shape[0] != len(generators):
+                return original(input, num_samples, replacement, generator=generator)
+            noise = torch.stack([
+                torch.empty_like(row).exponential_(1, generator=row_generator)
+                for row, row_generator in zip(input, generators)
+            ])
+            return torch.argmax(input / noise, dim=-1, keepdim=True).to(torch.int64)
+
+        with _sampling_lock:
+            sampling.multinomial = multinomial
+            try:
+                yield
+            finally:
+                sampling.multinomial = original
+
+    @contextmanager
+    def _timed(self, stage: str):
+        """Add the time spent in the block to self.timings[stage]."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - start
 
-    def generate_audio(self, text: str, language: str = "en-us") -> np.ndarray:
+    def generate_audio(self, text: str, language: str = "en-us", seed: Optional[int] = None) -> np.ndarray:
         """
         Generate TTS audio in-memory as a 1D numpy float32 array.
+        `seed` overrides the model seed for this call.
         """
-        torch.manual_seed(self.seed)
+        seed = self.seed if seed is None else seed
+        torch.manual_seed(seed)
         
-        # Prepare conditioning
-        cond_dict = make_cond_dict(text=text, speaker=self.speaker, language=language)
-        conditioning = self.model.prepare_conditioning(cond_dict)
+        with self._inference():
+            # Prepare conditioning (cached per text, language and speaker)
+            with self._timed("conditioning"):
+                conditioning = self.prepare_conditioning([text], language)
 
-        # Generate codes & decode into audio
-        codes = self.model.generate(conditioning)
-        wavs = self.model.autoencoder.decode(codes).cpu()
+            # Generate codes & decode into audio
+            with self._autocast():
+                with self._timed("generate"):
+                    codes = self._generate_codes(conditioning, [text], language, [seed])
+                with self._timed("decode"):
+                    wavs = self.model.autoencoder.decode(codes).float().cpu()
 
         # Return the first waveform (shape: [num_samples])
         return wavs[0].numpy().astype(np.float32)
 
+    def generate_audio_batch(
+        self, texts: List[str], language: str = "en-us", seed: Optional[int] = None,
+        seeds: Optional[List[int]] = None
+    ) -> List[np.ndarray]:
+        """
+        Generate TTS audio for several texts with a single conditioning, generate
+        and decode pass. Each returned waveform is trimmed to its own length.
+        `seeds` gives every text its own seed (see `per_row_seeds`); otherwise
+        the batch shares one random stream seeded with `seed`.
+        """
+        if not texts:
+            return []
+        if seeds is not None and len(seeds) != len(texts):
+            raise ValueError(f"Got {len(seeds)} seeds for {len(texts)} texts")
+        torch.manual_seed(self.seed if seed is None else seed)
+        batch_size = len(texts)
+
+        with self._inference():
+            # Prepare conditioning: one cached entry per text, shared speaker/emotion/etc.
+            with self._timed("conditioning"):
+                conditioning = self.prepare_conditioning(texts, language)
+
+            # Generate codes & decode into audio
+            with self._autocast():
+                with self._timed("generate"):
+                    codes = self._generate_codes(conditioning, texts, language, seeds)
+                with self._timed("decode"):
+                    wavs = self.model.autoencoder.decode(codes).float().cpu()
+
+        # Shorter lines finish early and are padded with zero codes up to the
+        # longest line; cut each waveform at its last non-padding frame.
+        samples_per_frame = wavs.shape[-1] // codes.shape[-1]
+        lengths = self._code_lengths(codes)
+        return [
+            wavs[i, ..., : lengths[i] * samples_per_frame].numpy().astype(np.float32)
+            for i in range(batch_size)
+        ]
+
+    def token_budget(self, text: str, language: str) -> int:
+        """
+        max_new_tokens for a line: its phoneme count spoken at the language's
+        rate (PHONEMES_PER_SECOND), times TOKEN_BUDGET_MARGIN, plus
+        TOKEN_BUDGET_MIN_SECONDS, capped at TOKEN_BUDGET_MAX_SECONDS.
+        """
+        num_phonemes = len(NON_PHONEME.sub("", self.conditioning_cache.phonemes(text, language)))
+        rate = PHONEMES_PER_SECOND.get(
+            language, PHONEMES_PER_SECOND.get(language.split("-")[0], PHONEMES_PER_SECOND.get("default", 12.0))
+        )
+        seconds = TOKEN_BUDGET_MIN_SECONDS + TOKEN_BUDGET_MARGIN * num_phonemes / rate
+        return int(min(seconds, TOKEN_BUDGET_MAX_SECONDS) * TOKENS_PER_SECOND)
+
+    def _generate_codes(self, conditioning, texts: List[str], language: str, seeds: Optional[List[int]] = None,
+                        max_new_tokens: Optional[int] = None):
+        """
+        Generate the codes of a batch, limited to the largest token budget of
+        its lines. Lines that run into the limit were cut off: they are
+        generated again with TOKEN_BUDGET_RETRY_FACTOR times the limit, up to
+        TOKEN_BUDGET_MAX_SECONDS, and their codes replace the cut-off ones.
+        With `seeds`, every line samples from its own generator.
+        """
+        if not USE_TOKEN_BUDGET:
+            with self._row_sampling(seeds):
+                codes = self.model.generate(conditioning, batch_size=len(texts))
+            self.token_stats["tokens_generated"] += len(texts) * codes.shape[-1]
+            self.token_stats["tokens_used"] += sum(self._code_lengths(codes))
+            return codes
+
+        is_retry = max_new_tokens is not None
+        if not is_retry:
+            budgets = [self.token_budget(text, language) for text in texts]
+            self.token_stats["tokens_budget"] += sum(budgets)
+            max_new_tokens = max(budgets)
+        with self._row_sampling(seeds):
+            codes = self.model.generate(conditioning, max_new_tokens=max_new_tokens, batch_size=len(texts))
+        self.token_stats["tokens_generated"] += len(texts) * codes.shape[-1]
+
+        limit = int(TOKEN_BUDGET_MAX_SECONDS * TOKENS_PER_SECOND)
+        lengths = self._code_lengths(codes)
+        cut = [i for i, length in enumerate(lengths) if length >= max_new_tokens - CUTOFF_SLACK]
+        if cut and max_new_tokens < limit:
+            self.token_stats["token_retries"] += len(cut)
+            retry_texts = [texts[i] for i in cut]
+            retry_tokens = min(limit, max_new_tokens * TOKEN_BUDGET_RETRY_FACTOR)
+            log.debug(f"{len(cut)} line(s) cut off at {max_new_tokens} tokens, retrying with {retry_tokens}")
+            # Conditioning is cached in float32 (see _autocast)
+            with torch.autocast(device_type=torch.device(self.use_device).type, enabled=False):
+                retry_conditioning = self.prepare_conditioning(retry_texts, language)
+            retry_seeds = [seeds[i] for i in cut] if seeds is not None else None
+            retried = self._generate_codes(retry_conditioning, retry_texts, language, retry_seeds, retry_tokens)
+
+            merged = codes.new_zeros(*codes.shape[:-1], max(codes.shape[-1], retried.shape[-1]))
+            merged[..., : codes.shape[-1]] = codes
+            for row, i in enumerate(cut):
+                merged[i] = 0
+                merged[i, ..., : retried.shape[-1]] = retried[row]
+            codes = merged
+
+        if not is_retry:
+            self.token_stats["tokens_used"] += sum(self._code_lengths(codes))
+        return codes
+
+    def prepare_conditioning(self, texts: List[str], language: str) -> torch.Tensor:
+        """
+        Prefix conditioning for a batch of texts sharing the current speaker,
+        assembled from per-line entries of the conditioning cache. Zonos
+        computes the prefix position by position and left-pads the phonemes of
+        shorter lines, so shorter lines are left-padded with `_padding_row`.
+        Rows are ordered like Zonos' own batches: all conditioned rows, then
+        all unconditioned (CFG) rows.
+        """
+        lines = [self._line_conditioning(text, language) for text in texts]
+        if len(lines) == 1:
+            return lines[0]
+        length = max(line.shape[1] for line in lines)
+        if any(line.shape[1] < length for line in lines):
+            pad_row = self._padding_row().to(lines[0])
+            lines = [
+                torch.cat([pad_row.expand(line.shape[0], length - line.shape[1], -1), line], dim=1)
+                for line in lines
+            ]
+        return torch.cat([line[half : half + 1] for half in range(lines[0].shape[0]) for line in lines])
+
+    def _line_conditioning(self, text: str, language: str) -> torch.Tensor:
+        """Build (or fetch from the conditioning cache) the prefix conditioning of one line."""
+        def build():
+            cond_dict = make_cond_dict(text=text, speaker=self.speaker, language=language)
+            with self.conditioning_cache.serving_phonemes(self._conditioning_module()):
+                return self.model.prepare_conditioning(cond_dict)
+
+        key = ConditioningCache.make_key(text, language, self.speaker_fingerprint)
+        return self.conditioning_cache.conditioning(key, build, self.use_device)
+
+    def _padding_row(self) -> torch.Tensor:
+        """
+        The prefix conditioning row of a phoneme pad token: the first row of a
+        two-line batch whose first line is empty and so padded by Zonos.
+        """
+        if self._pad_row is None:
+            cond_dict = make_cond_dict(text="", speaker=self.speaker, language="en-us")
+            cond_dict["espeak"] = (["", "a"], ["en-us", "en-us"])
+            for key, value in cond_dict.items():
+                if isinstance(value, torch.Tensor) and value.shape[0] == 1:
+                    cond_dict[key] = value.expand(2, *value.shape[1:])
+            with self.conditioning_cache.serving_phonemes(self._conditioning_module()):
+                self._pad_row = self.model.prepare_conditioning(cond_dict)[0, 0].clone()
+        return self._pad_row
+
+    def _conditioning_module(self):
+        """The module whose `phonemize` Zonos' espeak conditioner calls (see _sampling_module)."""
+        return sys.modules[type(self.model.prefix_conditioner).__module__]
+
+    @staticmethod
+    def _code_lengths(codes: torch.Tensor) -> List[int]:
+        """Number of frames before the trailing all-zero padding, per batch item."""
+        non_padding = (codes != 0).any(dim=1)  # [batch, frames]
+        positions = torch.arange(1, codes.shape[-1] + 1, device=codes.device)
+        return (non_padding * positions).max(dim=-1).values.tolist()
+
     @property
     def sampling_rate(self) -> int:
         """Convenient property to access the model's sampling rate."""
@@ -66,14 +442,20 @@ class ZonosTTS(TTSModel):
         reference_audio_path: str = "assets/exampleaudio.mp3",
         language: str = "en-us",
         use_device = device,
-        seed: int = 421
+        seed: int = 421,
+        reference_audio_paths: Optional[Dict[str, str]] = None,
+        speaker_store_dir: Optional[str] = SPEAKER_EMBEDDING_DIR,
+        acceleration: Optional[Iterable[str]] = None
     ):
         # Call the base TTSModel initializer
         super().__init__(
             model_path=model_path,
             reference_audio_path=reference_audio_path,
             use_device=use_device,
-            seed=seed
+            seed=seed,
+            reference_audio_paths=reference_audio_paths,
+            speaker_store_dir=speaker_store_dir,
+            acceleration=acceleration
         )
         
         # Store language so that .tts() can default to it
@@ -86,7 +468,7 @@ class ZonosTTS(TTSModel):
         
         self.synthesizer = SynthesizerMock(self.sampling_rate)
 
-    def tts(self, text: str, speaker=None) -> np.ndarray:
+    def tts(self, text: str, speaker=None, seed: Optional[int] = None) -> np.ndarray:
         """
         Return a NumPy array of audio samples. 
         'speaker' can be used if your pipeline wants to pass a separate speaker
@@ -96,7 +478,16 @@ class ZonosTTS(TTSModel):
         # e.g., if speaker is not None: self.speaker = speaker
         #
         # Then call the base class's generate_audio method:
-        return self.generate_audio(text=text, language=self.language)
+        return self.generate_audio(text=text, language=self.language, seed=seed)
+
+    def tts_batch(
+        self, texts: List[str], seed: Optional[int] = None, seeds: Optional[List[int]] = None
+    ) -> List[np.ndarray]:
+        """
+        Batched counterpart of `.tts()`: one NumPy waveform per input text.
+        `seeds` seeds every text separately (see TTSModel.per_row_seeds).
+        """
+        return self.generate_audio_batch(texts=texts, language=self.language, seed=seed, seeds=seeds)
 
 
 if __name__ == "__main__":
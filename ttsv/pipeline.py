@@ -0,0 +1,316 @@
+import time
+import queue
+import threading
+from ttsv.metrics import metrics
+from ttsv.writer import AsyncWriter
+from ttsv.config import (
+    CHANNEL_TO_UPLOAD,
+    LANGUAGES_TO_PROCESS,
+    INPUT_DIRECTORY,
+    OUTPUT_DIRECTORY,
+    FILENAME_TO_PROCESS,
+    KEEP_MERGED_WAV,
+    USE_SYNTHESIS_CACHE,
+    SYNTHESIS_CACHE_DIR,
+    SYNTHESIS_CACHE_MAX_BYTES,
+    TTS_BATCH_SIZE,
+    TTS_NUM_WORKERS,
+    TTS_THREADS_PER_WORKER,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_PCM_QUEUE_SIZE,
+)
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages. A full queue blocks the
+    upstream stage (backpressure); the time spent blocked on either side and
+    the queue depth are recorded for the end-of-run summary.
+    """
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.items = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.put_wait = 0.0  # upstream blocked on a full queue
+        self.get_wait = 0.0  # downstream starved on an empty queue
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()  # several writer threads may put
+
+    def put(self, item):
+        start = time.perf_counter()
+        self._queue.put(item)
+        waited = time.perf_counter() - start
+        depth = self._queue.qsize()
+        with self._lock:
+            self.put_wait += waited
+            self.items += 1
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_total += depth
+
+    def get(self):
+        start = time.perf_counter()
+        item = self._queue.get()
+        self.get_wait += time.perf_counter() - start
+        return item
+
+    def summary(self):
+        mean_depth = self.depth_total / self.items if self.items else 0.0
+        return (
+            f"{self.name}: {self.items} items, depth max {self.max_depth}/{self.maxsize} "
+            f"mean {mean_depth:.1f}, upstream blocked {self.put_wait:.1f}s, "
+            f"downstream waited {self.get_wait:.1f}s"
+        )
+
+
+class QueueSink(StageQueue):
+    """
+    Sink that hands merged PCM to the encoder thread through a bounded queue,
+    so merging and encoding overlap.
+    """
+    def __init__(self, name, maxsize):
+        super().__init__(name, maxsize)
+        self.frames_written = 0
+        self.is_open = False
+
+    def open(self, sample_rate, channels=1):
+        self.is_open = True
+        self.put(("open", sample_rate, channels))
+
+    def write(self, frames):
+        self.put(("frames", frames))
+        self.frames_written += frames.shape[0]
+
+    def close(self):
+        self.put(("close",))
+
+    def abort(self):
+        self.put(("abort",))
+
+
+class ChannelPipeline:
+    """
+    Merge and encode stages of one channel. Clips arrive in any order as
+    (line_num, lang, clip) on `lines`, where a clip is (sample_rate, int16
+    frames), a file map entry (see merge.clip_info), or None for a line that
+    failed. Lines are merged in
+    order as soon as every clip they need is in, and the merged PCM streams
+    into ffmpeg (and the merged WAV when `keep_wav` is set).
+    """
+    def __init__(self, channel, expected, keep_wav=KEEP_MERGED_WAV,
+                 queue_size=PIPELINE_QUEUE_SIZE, pcm_queue_size=PIPELINE_PCM_QUEUE_SIZE):
+        from ttsv.merge import StreamMerger, open_merge_sink
+
+        self.channel = channel
+        self.expected = expected  # line_num -> set of langs, for every line 1..max
+        self.lines = StageQueue(f"synthesis -> merge [{channel}]", queue_size)
+        self.pcm = QueueSink(f"merge -> encode [{channel}]", pcm_queue_size)
+        self.boundaries = []
+        self.merger = StreamMerger(channel, self.pcm, self.boundaries)
+        self.sink = open_merge_sink(channel, encode_video=True, keep_wav=keep_wav)
+        self.merge_error = None
+        self.encode_error = None
+        self._threads = [
+            threading.Thread(target=self._merge, name=f"merge-{channel}", daemon=True),
+            threading.Thread(target=self._encode, name=f"encode-{channel}", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def ok(self):
+        return self.merge_error is None and self.encode_error is None and self.merger.sample_rate is not None
+
+    def _merge(self):
+        from ttsv.merge import read_clip
+
+        pending = {}  # line_num -> {lang: clip}
+        next_line = 1
+        try:
+            while True:
+                item = self.lines.get()
+                if item is None:
+                    break
+                line_num, lang, clip = item
+                pending.setdefault(line_num, {})[lang] = clip
+                while next_line in self.expected and self.expected[next_line] <= pending.get(next_line, {}).keys():
+                    clips = pending.pop(next_line, {})
+                    self.merger.add_line({
+                        lang: read_clip(clip) if isinstance(clip, dict) else clip
+                        for lang, clip in clips.items() if clip is not None
+                    })
+                    next_line += 1
+            if next_line in self.expected:
+                raise RuntimeError(f"synthesis ended before line {next_line} arrived")
+            self.pcm.close()
+        except Exception as e:
+            self.merge_error = e
+            self.pcm.abort()
+            while self.lines.get() is not None:  # keep synthesis from blocking
+                pass
+
+    def _encode(self):
+        try:
+            while True:
+                message = self.pcm.get()
+                if message[0] == "open":
+                    self.sink.open(message[1], message[2])
+                elif message[0] == "frames":
+                    self.sink.write(message[1])
+                elif message[0] == "close":
+                    self.sink.close()
+                    return
+                else:
+                    self.sink.abort()
+                    return
+        except Exception as e:
+            self.encode_error = e
+            self.sink.abort()
+            while self.pcm.get()[0] not in ("close", "abort"):  # keep merging from blocking
+                pass
+
+    def finish(self):
+        """Write the timeline and subtitles once the channel's audio is done."""
+        from ttsv.merge import gather_files, create_subtitles, save_outputs, save_timeline
+
+        file_map = gather_files(self.channel)
+        save_timeline(self.channel, self.merger.sample_rate, self.boundaries)
+        subtitles = create_subtitles(file_map, self.channel, len(self.merger.timestamps), self.merger.timestamps)
+        save_outputs(self.channel, subtitles)
+
+
+def run_pipeline(model, channels=CHANNEL_TO_UPLOAD, languages=LANGUAGES_TO_PROCESS, cache=None,
+                 batch_size=TTS_BATCH_SIZE, num_workers=TTS_NUM_WORKERS, threads_per_worker=TTS_THREADS_PER_WORKER):
+    """
+    Run synthesis, merging and encoding (steps 1-3) as one overlapped pipeline.
+
+    Synthesis works through the document in line order, interleaving the
+    languages, and hands every finished clip to the merge stage of each
+    channel that uses it; merged PCM is piped straight into that channel's
+    encoder. A channel's video is therefore assembled while later lines are
+    still being synthesized, and finishes shortly after the last line.
+
+    Returns {"languages": {lang: failed line count}, "channels": {channel: ok}}.
+    """
+    from ttsv.process_file import plan_synthesis, run_synthesis, save_line, print_synthesis_summary
+    from ttsv.synthesis_cache import SynthesisCache
+    from ttsv.merge import clip_info
+
+    if cache is None and USE_SYNTHESIS_CACHE:
+        cache = SynthesisCache(SYNTHESIS_CACHE_DIR, max_bytes=SYNTHESIS_CACHE_MAX_BYTES)
+
+    start = time.perf_counter()
+    plan = plan_synthesis(INPUT_DIRECTORY, FILENAME_TO_PROCESS, OUTPUT_DIRECTORY, model, cache,
+                          batch_size, languages, keep_order=True)
+
+    pipelines = {}
+    for channel in channels:
+        langs = {channel, "en"}
+        max_line = max((line_num for lang in langs for line_num, _ in plan.lines.get(lang, [])), default=0)
+        expected = {line_num: set() for line_num in range(1, max_line + 1)}
+        for lang in langs:
+            for line_num, _ in plan.lines.get(lang, []):
+                expected[line_num].add(lang)
+        pipelines[channel] = ChannelPipeline(channel, expected)
+        pipelines[channel].start()
+
+    def publish(line_num, lang, clip):
+        for channel, pipeline in pipelines.items():
+            if lang in (channel, "en"):
+                pipeline.lines.put((line_num, lang, clip))
+
+    # Clips served from the cache are merged straight from their files
+    for line_num, lang in sorted(plan.cached):
+        publish(line_num, lang, clip_info(plan.manifest, plan.manifest.get(line_num, lang)))
+
+    failed = {lang: 0 for lang in languages}
+
+    def write_and_publish(lang, line_num, cleaned_line, sample_rate, audio):
+        try:
+            int16_audio = save_line(plan, cache, lang, line_num, cleaned_line, sample_rate, audio)
+        except Exception:
+            publish(line_num, lang, None)
+            raise
+        publish(line_num, lang, (sample_rate, int16_audio))
+
+    with AsyncWriter() as writer:
+        results = run_synthesis(model, plan.tasks, num_workers, threads_per_worker)
+        for (lang, mapped_lang, batch), result, error in results:
+            if error is not None:
+                line_nums = ", ".join(str(line_num) for line_num, _ in batch)
+                print(f"Error processing lines {line_nums} ({lang}): {str(error)}")
+                failed[lang] += len(batch)
+                for line_num, _ in batch:
+                    publish(line_num, lang, None)
+                continue
+
+            sample_rate, audios, stats = result
+            metrics.record_synthesis(lang, [audio.shape[-1] for audio in audios], sample_rate, stats)
+            for (line_num, cleaned_line), audio in zip(batch, audios):
+                writer.submit((lang, line_num), write_and_publish, lang, line_num, cleaned_line, sample_rate, audio)
+
+        for (lang, line_num), error in writer.flush():
+            print(f"Error processing line {line_num} ({lang}): {str(error)}")
+            failed[lang] += 1
+
+    synthesis_done = time.perf_counter()
+    print_synthesis_summary(plan, model, cache)
+
+    for pipeline in pipelines.values():
+        pipeline.lines.put(None)
+    for pipeline in pipelines.values():
+        pipeline.join()
+    # Mergers may still read packed clips until joined, so compact only now
+    plan.save()
+
+    channel_ok = {}
+    for channel, pipeline in pipelines.items():
+        if pipeline.merge_error or pipeline.encode_error:
+            print(f"ERROR: Pipeline for channel '{channel}' failed: {pipeline.merge_error or pipeline.encode_error}")
+        elif pipeline.merger.sample_rate is None:
+            print(f"ERROR: No valid audio files found for channel '{channel}'.")
+        else:
+            pipeline.finish()
+        channel_ok[channel] = pipeline.ok
+    end = time.perf_counter()
+
+    print("Pipeline summary:")
+    print(f"  synthesis {synthesis_done - start:.1f}s, tail after synthesis {end - synthesis_done:.1f}s, "
+          f"total {end - start:.1f}s")
+    metrics.observe("pipeline_synthesis_seconds", synthesis_done - start)
+    metrics.observe("pipeline_tail_seconds", end - synthesis_done)
+    for channel, pipeline in pipelines.items():
+        for stage_queue in (pipeline.lines, pipeline.pcm):
+            print(f"  {stage_queue.summary()}")
+            labels = {"channel": channel, "queue": "lines" if stage_queue is pipeline.lines else "pcm"}
+            metrics.observe("pipeline_queue_max_depth", stage_queue.max_depth, **labels)
+            metrics.observe("pipeline_queue_blocked_seconds", stage_queue.put_wait, **labels)
+    return {"languages": failed, "channels": channel_ok}
+
+
+def run_pipeline_units(runner, units, get_model):
+    """
+    Run the step 1-3 `units` through the pipeline unless they are all up to
+    date, and record the languages and channels that succeeded so later runs
+    (pipelined or not) can skip them.
+    """
+    if not runner.plan(units):
+        print("[Pipeline] Steps 1-3 up to date, skipping")
+        return
+    result = run_pipeline(get_model())
+    for unit in units:
+        if unit.step == 1:
+            ok = result["languages"].get(unit.name) == 0
+        else:
+            ok = result["channels"].get(unit.name, False)
+        if ok:
+            runner.record(unit)
+        else:
+            print(f"[Step {unit.step}] {unit.name}: failed, not recorded")
@@ -1,8 +1,15 @@
 import os
+import time
+import hashlib
 import numpy as np
 from typing import Union, List
 from scipy.io.wavfile import write as write_wav
-from ttsv.model import ZonosTTS
+from ttsv.synthesis_cache import SynthesisCache
+from ttsv.chunking import split_text, crossfade_join
+from ttsv.writer import AsyncWriter
+from ttsv.manifest import Manifest, manifest_path
+from ttsv.clip_store import ClipStore, clip_store_path, compact_if_wasteful
+from ttsv.metrics import log, metrics
 from ttsv.config import (
     LANGUAGES_TO_PROCESS,
     OUTPUT_DIRECTORY,
@@ -10,6 +17,15 @@ from ttsv.config import (
     INPUT_DIRECTORY,
     USE_CHUNKING,
     MAX_CHARS_PER_LINE, 
+    CHUNK_CROSSFADE_MS,
+    USE_SYNTHESIS_CACHE,
+    SYNTHESIS_CACHE_DIR,
+    SYNTHESIS_CACHE_MAX_BYTES,
+    TTS_BATCH_SIZE,
+    TTS_NUM_WORKERS,
+    TTS_THREADS_PER_WORKER,
+    CLIP_STORE,
+    TTS_SERVER_URL,
 )
 
 def clean_line(line: str, forbidden_chars: Union[None, List[str]] = None) -> str:
@@ -22,25 +38,286 @@ def clean_line(line: str, forbidden_chars: Union[None, List[str]] = None) -> str
     return line.strip().translate(translation_table)
 
 
-def process_input_texts(
-    input_dir=INPUT_DIRECTORY, 
-    filename=FILENAME_TO_PROCESS,
-    output_dir=OUTPUT_DIRECTORY,
-    model=None 
-):
-    if model is None:
-        raise ValueError("No TTS model (tts) provided to process_input_texts.")
+def to_int16(audio: np.ndarray) -> np.ndarray:
+    """
+    Peak-normalize a float waveform and convert it to int16 PCM.
+    Normalization and clipping happen in place, so float32 input is
+    overwritten and the only new array is the int16 result.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1 and audio.shape[0] == 1:
+        audio = audio.squeeze(axis=0)  # shape: (N,)
+    peak = max(float(audio.max(initial=0.0)), -float(audio.min(initial=0.0)), 1e-8)
+    audio /= peak  # normalizes to within [-1,1]
+    np.clip(audio, -1.0, 1.0, out=audio)
+    audio *= 32767
+    return audio.astype(np.int16)
+
+
+def line_wav_path(speech_dir: str, line_num: int, lang: str) -> str:
+    """
+    Path of a line's clip: '{speech_dir}/{lineNum}-{lang}.wav'. Duration, text and
+    sample rate live in the document manifest rather than in the filename.
+    """
+    return os.path.join(speech_dir, f"{line_num}-{lang}.wav")
 
-    SPECIAL_LANGUAGE_MAP = {
-        "en": "en-us"
-        # add more overrides as needed
-    }
 
-    for lang in LANGUAGES_TO_PROCESS:
+def read_input_lines(input_txt: str) -> List[tuple]:
+    """
+    Read an input file and return (line_num, cleaned_line) pairs, skipping empty lines.
+    Line numbers are 1-based and count empty lines so they match the source file.
+    """
+    lines = []
+    with open(input_txt, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, start=1):
+            cleaned_line = clean_line(line)
+            if cleaned_line:
+                lines.append((line_num, cleaned_line))
+    return lines
+
+
+def line_seed(base_seed: int, text: str, language: str) -> int:
+    """
+    Derive a per-line seed from the model seed and the line's content, so a
+    line's audio doesn't depend on which worker synthesizes it or when.
+    """
+    digest = hashlib.sha256(f"{base_seed}\x1f{language}\x1f{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little") & 0x7FFFFFFF
+
+
+def _seed_kwargs(model, text: str) -> dict:
+    """Per-line seed argument for models that are seeded (e.g. ZonosTTS)."""
+    if getattr(model, "seed", None) is None:
+        return {}
+    return {"seed": line_seed(model.seed, text, model.language)}
+
+
+def chunking_settings(text: str):
+    """
+    (MAX_CHARS_PER_LINE, CHUNK_CROSSFADE_MS) for a line synthesized in chunks
+    (see synthesize_text), which its audio depends on; None otherwise.
+    """
+    if USE_CHUNKING and len(text) > MAX_CHARS_PER_LINE:
+        return MAX_CHARS_PER_LINE, CHUNK_CROSSFADE_MS
+    return None
+
+
+def synthesize_text(model, text: str) -> np.ndarray:
+    """
+    Synthesize a single line. With USE_CHUNKING, a line longer than
+    MAX_CHARS_PER_LINE is split at sentence, clause or word boundaries, its
+    chunks are synthesized as one batch and joined with short crossfades.
+    """
+    if USE_CHUNKING and len(text) > MAX_CHARS_PER_LINE:
+        chunks = split_text(text, MAX_CHARS_PER_LINE)
+        audios = synthesize_batch(model, chunks)
+        return crossfade_join(audios, model.synthesizer.output_sample_rate, CHUNK_CROSSFADE_MS)
+
+    if hasattr(model, 'speaker') and model.speaker is not None:
+        audio = model.tts(text=text, speaker=model.speaker, **_seed_kwargs(model, text))
+    else:
+        audio = model.tts(text=text, **_seed_kwargs(model, text))
+    return np.array(audio, dtype=np.float32)
+
+
+def synthesize_batch(model, texts: List[str]) -> List[np.ndarray]:
+    """
+    Synthesize several lines together when the model supports `tts_batch`,
+    falling back to one `tts` call per line otherwise. Every line of a batch
+    gets its own seed, so its audio doesn't depend on the lines it is batched
+    with; seeded models that can't seed batch rows separately
+    (`per_row_seeds`) synthesize line by line instead.
+    """
+    if len(texts) > 1 and hasattr(model, "tts_batch"):
+        if getattr(model, "seed", None) is None:
+            audios = model.tts_batch(texts)
+        elif getattr(model, "per_row_seeds", False):
+            audios = model.tts_batch(texts, seeds=[line_seed(model.seed, text, model.language) for text in texts])
+        else:
+            return [synthesize_text(model, text) for text in texts]
+        return [np.array(audio, dtype=np.float32) for audio in audios]
+    return [synthesize_text(model, text) for text in texts]
+
+
+def make_batches(lines: List[tuple], batch_size: int, keep_order: bool = False) -> List[List[tuple]]:
+    """
+    Group (line_num, text) pairs into batches of at most `batch_size`.
+    Lines that need chunking are kept on their own; the others are sorted by
+    length first so each batch pads as little as possible, unless
+    `keep_order` asks for batches of consecutive lines.
+    """
+    batch_size = max(1, batch_size)
+
+    def needs_chunking(item):
+        return USE_CHUNKING and len(item[1]) > MAX_CHARS_PER_LINE
+
+    if keep_order:
+        batches, current = [], []
+        for item in lines:
+            if needs_chunking(item):
+                batches += [current] if current else []
+                batches.append([item])
+                current = []
+                continue
+            current.append(item)
+            if len(current) == batch_size:
+                batches.append(current)
+                current = []
+        return batches + ([current] if current else [])
+
+    single = [item for item in lines if needs_chunking(item)]
+    batchable = sorted(
+        (item for item in lines if not needs_chunking(item)),
+        key=lambda item: (len(item[1]), item[0])
+    )
+    batches = [batchable[i : i + batch_size] for i in range(0, len(batchable), batch_size)]
+    return batches + [[item] for item in single]
+
+
+def synthesize_lines(model, batch: List[tuple]) -> List[np.ndarray]:
+    """
+    Synthesize one batch produced by `make_batches`.
+    """
+    if len(batch) == 1:
+        return [synthesize_text(model, batch[0][1])]
+    return synthesize_batch(model, [text for _, text in batch])
+
+
+def synthesize_task(model, task: tuple) -> tuple:
+    """
+    Synthesize one (lang, mapped_lang, batch) work item and return
+    (sample_rate, [float audio per line], stats), where stats holds the
+    synthesis seconds and, for models that track them, the conditioning,
+    generate and decode seconds and the token counters. Stats travel with the result so timings
+    from pool workers reach the parent's metrics.
+    """
+    lang, mapped_lang, batch = task
+    model.language = mapped_lang
+    if hasattr(model, "use_speaker_for"):
+        model.use_speaker_for(lang)
+
+    timings_before = dict(getattr(model, "timings", {}))
+    tokens_before = dict(getattr(model, "token_stats", {}))
+    start = time.perf_counter()
+    audios = synthesize_lines(model, batch)
+    stats = {"seconds": time.perf_counter() - start}
+    for stage, seconds in getattr(model, "timings", {}).items():
+        stats[stage] = seconds - timings_before.get(stage, 0.0)
+    for counter, count in getattr(model, "token_stats", {}).items():
+        stats[counter] = count - tokens_before.get(counter, 0)
+
+    sample_rate = model.synthesizer.output_sample_rate
+    for (line_num, _), audio in zip(batch, audios):
+        log.debug(f"line_num={line_num}, lang={lang}, audio_shape={audio.shape}, "
+                  f"sample_rate={sample_rate}, len(audio)={len(audio)}")
+    return sample_rate, audios, stats
+
+
+def run_tasks_serially(model, tasks: List[tuple]):
+    """
+    Yield (task, result, error) for each work item, in order, in this process.
+    """
+    for task in tasks:
+        try:
+            yield task, synthesize_task(model, task), None
+        except Exception as e:
+            yield task, None, e
+
+
+SPECIAL_LANGUAGE_MAP = {
+    "en": "en-us"
+    # add more overrides as needed
+}
+
+
+class SynthesisPlan:
+    """
+    Work left for one synthesis run: the document manifest, the batches to
+    synthesize as (lang, mapped_lang, [(line_num, text), ...]) tasks, the
+    synthesis cache keys of those lines, every input line per language, and
+    the (line_num, lang) clips that were served from the cache.
+    """
+    def __init__(self, manifest, output_dir, filename):
+        self.manifest = manifest
+        self.output_dir = output_dir
+        self.filename = filename
+        self.tasks = []
+        self.cache_keys = {}  # (lang, line_num) -> synthesis cache key
+        self.lines = {}       # lang -> [(line_num, cleaned_line), ...]
+        self.cached = []      # [(line_num, lang), ...]
+        self.discarded = []   # [(line_num, lang), ...] whose stale record was dropped
+        self.reused = 0       # Cached lines already in the packed store, without a cache lookup
+
+    def speech_dir(self, lang):
+        return os.path.join(self.output_dir, self.filename, lang, "speech")
+
+    def add_clip(self, lang, line_num, cleaned_line, sample_rate, int16_audio):
+        """
+        Write a clip where CLIP_STORE says (its own WAV file, or appended to the
+        language's packed store) and record it in the manifest.
+        """
+        key = self.cache_keys.get((lang, line_num))
+        if CLIP_STORE == "packed":
+            store_path = clip_store_path(self.output_dir, self.filename, lang)
+            offset = ClipStore.open(store_path).append(int16_audio)
+            self.manifest.add(line_num, lang, cleaned_line, int16_audio.shape[-1], sample_rate,
+                              store_path=store_path, offset=offset, key=key)
+        else:
+            wav_path = line_wav_path(self.speech_dir(lang), line_num, lang)
+            write_wav(wav_path, sample_rate, int16_audio)
+            self.manifest.add(line_num, lang, cleaned_line, int16_audio.shape[-1], sample_rate, wav_path, key=key)
+
+    def discard_stale_clip(self, lang, line_num, cleaned_line, cache_key):
+        """
+        Drop the line's record (and its WAV file) when it was made for other
+        text or, per the cache key, other settings, so a failed re-synthesis
+        can't leave the old clip to be merged. Records without a key are
+        judged by their text.
+        """
+        entry = self.manifest.get(line_num, lang)
+        if entry is None or (entry["text"] == cleaned_line and entry.get("key", cache_key) == cache_key):
+            return
+        self.manifest.discard(line_num, lang)
+        self.discarded.append((line_num, lang))
+        if "wav" in entry:
+            try:
+                os.remove(self.manifest.clip_path(entry))
+            except FileNotFoundError:
+                pass
+
+    def has_packed_clip(self, lang, line_num, cache_key):
+        """
+        Whether the packed store already holds this line's clip for `cache_key`
+        (from an earlier run), so it doesn't need to be appended again.
+        """
+        entry = self.manifest.get(line_num, lang)
+        if entry is None or "store" not in entry or entry.get("key") != cache_key:
+            return False
+        store = ClipStore.open(self.manifest.clip_path(entry))
+        return entry["offset"] + entry["samples"] <= store.size_samples()
+
+    def save(self):
+        """Compact wasteful packed stores, then save the manifest."""
+        for lang in self.lines:
+            compact_if_wasteful(self.manifest, lang)
+        self.manifest.save()
+
+
+def plan_synthesis(input_dir, filename, output_dir, model, cache, batch_size, languages=None, keep_order=False):
+    """
+    Read the input files, serve what the synthesis cache already has and
+    batch the remaining lines. With `keep_order`, batches hold consecutive
+    lines and tasks are interleaved across languages by line number, so
+    early lines of every language finish first. Returns a SynthesisPlan.
+    """
+    plan = SynthesisPlan(Manifest.load(manifest_path(output_dir, filename)), output_dir, filename)
+    for lang in (LANGUAGES_TO_PROCESS if languages is None else languages):
         # If 'lang' is "en", force it to "en-us"
         # Otherwise, use it unchanged
         mapped_lang = SPECIAL_LANGUAGE_MAP.get(lang, lang)
         model.language = mapped_lang
+        if hasattr(model, "use_speaker_for"):
+            model.use_speaker_for(lang)
 
         input_txt = os.path.join(input_dir, f"{filename}-{lang}.txt")
         if not os.path.isfile(input_txt):
@@ -48,84 +325,170 @@ def process_input_texts(
             continue
 
         # Create output directories
-        speech_dir = os.path.join(output_dir, filename, lang, "speech")
-        text_dir = os.path.join(output_dir, filename, lang, "text")
+        speech_dir = plan.speech_dir(lang)
         os.makedirs(speech_dir, exist_ok=True)
-        os.makedirs(text_dir, exist_ok=True)
-
-
-        with open(input_txt, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, start=1):
-                cleaned_line = clean_line(line)
-                if not cleaned_line:
-                    continue  # Skip empty lines
-
-                try:
-                    # Possibly chunk up long lines
-                    if USE_CHUNKING and len(cleaned_line) > MAX_CHARS_PER_LINE:
-                        chunks = [
-                            cleaned_line[i : i + MAX_CHARS_PER_LINE]
-                            for i in range(0, len(cleaned_line), MAX_CHARS_PER_LINE)
-                        ]
-                        
-                        audio_all = []
-                        for chunk in chunks:
-                            # TTS call (model.language is now `lang`)
-                            if hasattr(model, 'speaker') and model.speaker is not None:
-                                audio_chunk = model.tts(text=chunk, speaker=model.speaker)
-                            else:
-                                audio_chunk = model.tts(text=chunk)
-
-                            audio_chunk = np.array(audio_chunk, dtype=np.float32)
-                            audio_all.append(audio_chunk)
-                        
-                        audio = np.concatenate(audio_all) if audio_all else np.array([], dtype=np.float32)
-                    
+
+        lines = read_input_lines(input_txt)
+        plan.lines[lang] = lines
+        plan.manifest.retain(lang, [line_num for line_num, _ in lines])
+
+        # Serve what we can from the cache
+        pending = []
+        for line_num, cleaned_line in lines:
+            cache_key = None
+            if cache is not None:
+                cache_key = cache.make_key(cleaned_line, mapped_lang, model, chunking_settings(cleaned_line))
+            plan.discard_stale_clip(lang, line_num, cleaned_line, cache_key)
+            if cache is not None:
+                plan.cache_keys[(lang, line_num)] = cache_key
+                if CLIP_STORE == "packed" and plan.has_packed_clip(lang, line_num, cache_key):
+                    # Served from the store rather than the cache, but a hit all the same
+                    cache.hits += 1
+                    plan.reused += 1
+                    plan.cached.append((line_num, lang))
+                    continue
+                cached = cache.lookup(cache_key)
+                if cached is not None:
+                    _, sample_rate, num_samples = cached
+                    if CLIP_STORE == "packed":
+                        entry = cache.read(cache_key)
+                        if entry is not None:
+                            plan.add_clip(lang, line_num, cleaned_line, *entry)
+                            plan.cached.append((line_num, lang))
+                            continue
                     else:
-                        # Single chunk
-                        if hasattr(model, 'speaker') and model.speaker is not None:
-                            audio = model.tts(text=cleaned_line, speaker=model.speaker)
-                        else:
-                            audio = model.tts(text=cleaned_line)
-
-                        audio = np.array(audio, dtype=np.float32)
-
-                    # Audio metadata
-                    sample_rate = model.synthesizer.output_sample_rate
-                    num_samples = audio.shape[-1]
-                    duration_ms = int((num_samples / sample_rate) * 1000)
-                    print(
-    f"Debug: line_num={line_num}, lang={lang}, ",
-    f"audio_shape={audio.shape}, sample_rate={sample_rate}, len(audio)={len(audio)}"
-)
+                        wav_path = line_wav_path(speech_dir, line_num, lang)
+                        if cache.copy_to(cache_key, wav_path):
+                            plan.manifest.add(line_num, lang, cleaned_line, num_samples, sample_rate, wav_path,
+                                              key=cache_key)
+                            plan.cached.append((line_num, lang))
+                            continue
+            pending.append((line_num, cleaned_line))
+
+        if cache is not None:
+            metrics.observe("synthesis_cache_hits", len(lines) - len(pending), lang=lang)
+            metrics.observe("synthesis_cache_misses", len(pending), lang=lang)
+        plan.tasks.extend((lang, mapped_lang, batch) for batch in make_batches(pending, batch_size, keep_order))
 
-                    # Filenames
-                    base_name = f"{line_num}-{lang}-{duration_ms}"
-                    wav_path = os.path.join(speech_dir, f"{base_name}.wav")
-                    txt_path = os.path.join(text_dir, f"{base_name}.txt")
+    if plan.discarded:
+        # Persist the drops now: a crash mustn't bring the stale records back
+        plan.manifest.save()
+    if keep_order:
+        plan.tasks.sort(key=lambda task: task[2][0][0])
+    return plan
 
-                    # Save the WAV file
-                    if audio.shape[0] == 1:
-                        audio = audio.squeeze(axis=0)  # shape: (N,)
 
-                    audio = audio / max(np.abs(audio).max(), 1e-8)  # normalizes to within [-1,1]
-                    audio_clamped = np.clip(audio, -1.0, 1.0)
-                    int16_audio = (audio_clamped * 32767).astype(np.int16)
-                    write_wav(wav_path, sample_rate, int16_audio)
+def run_synthesis(model, tasks, num_workers, threads_per_worker):
+    """
+    Yield (task, result, error) for every task, sharded across `num_workers`
+    processes when more than one is requested.
+    """
+    if num_workers > 1 and tasks:
+        from ttsv.worker_pool import can_use_worker_pool, run_tasks_in_pool
+        if can_use_worker_pool(model):
+            return run_tasks_in_pool(model, tasks, num_workers, threads_per_worker)
+        print("WARNING: Worker pool needs a CPU model and the 'fork' start method; running serially.")
+    return run_tasks_serially(model, tasks)
 
-                    # Save the cleaned text
-                    with open(txt_path, "w", encoding="utf-8") as out_f:
-                        out_f.write(cleaned_line)
 
-                except Exception as e:
-                    print(f"Error processing line {line_num} ({lang}): {str(e)}")
-                    continue
+def save_line(plan, cache, lang, line_num, cleaned_line, sample_rate, audio):
+    """
+    Convert a synthesized line to int16, write its clip, store it in the
+    synthesis cache and record it in the manifest. Runs on the writer pool.
+    Returns the int16 audio.
+    """
+    int16_audio = to_int16(audio)
+
+    # Save the clip and record its text and exact length in the manifest
+    with metrics.timer("wav_write_seconds", lang=lang):
+        plan.add_clip(lang, line_num, cleaned_line, sample_rate, int16_audio)
+    if cache is not None:
+        cache.store(plan.cache_keys[(lang, line_num)], sample_rate, int16_audio)
+    return int16_audio
+
 
-        print(f"Completed TTS for '{lang}': {line_num} lines processed")
+def print_synthesis_summary(plan, model, cache):
+    for lang, lines in plan.lines.items():
+        print(f"Completed TTS for '{lang}': {len(lines)} lines processed")
 
+    if cache is not None:
+        reused = f" ({plan.reused} already in the packed store)" if plan.reused else ""
+        print(f"Synthesis cache: {cache.hits} hits{reused}, {cache.misses} misses")
+    if getattr(model, "conditioning_cache", None) is not None:
+        print(model.conditioning_cache.summary())
+    for lang in plan.lines:
+        used, wasted = metrics.summary("tts_tokens_used", lang=lang), metrics.summary("tts_tokens_wasted", lang=lang)
+        if used and wasted and used[1] + wasted[1]:
+            retries = metrics.summary("tts_token_retries", lang=lang)[1]
+            print(f"Tokens for '{lang}': {used[1]:.0f} used, {wasted[1]:.0f} wasted "
+                  f"({wasted[1] / (used[1] + wasted[1]):.0%}), {retries:.0f} retried lines")
+
+
+def process_input_texts(
+    input_dir=INPUT_DIRECTORY, 
+    filename=FILENAME_TO_PROCESS,
+    output_dir=OUTPUT_DIRECTORY,
+    model=None,
+    cache=None,
+    batch_size=TTS_BATCH_SIZE,
+    num_workers=TTS_NUM_WORKERS,
+    threads_per_worker=TTS_THREADS_PER_WORKER,
+    languages=None
+):
+    """
+    Synthesize every line of `{filename}-{lang}.txt` for each language in
+    LANGUAGES_TO_PROCESS. Lines found in the synthesis cache are written
+    straight from it without calling the model; the rest are synthesized
+    in batches of `batch_size` lines, sharded across `num_workers`
+    processes when more than one is requested.
+
+    Every clip is recorded in the document manifest (see ttsv.manifest).
+    `languages` restricts the run to a subset of LANGUAGES_TO_PROCESS.
+    Without a `model`, synthesis is delegated to the server at
+    TTS_SERVER_URL (see ttsv.server), if one is configured.
+    Returns the number of lines that failed.
+    """
+    if model is None and TTS_SERVER_URL:
+        from ttsv.server import RemoteTTS
+        model = RemoteTTS(TTS_SERVER_URL)
+    if model is None:
+        raise ValueError("No TTS model (tts) provided to process_input_texts.")
+
+    if cache is None and USE_SYNTHESIS_CACHE:
+        cache = SynthesisCache(SYNTHESIS_CACHE_DIR, max_bytes=SYNTHESIS_CACHE_MAX_BYTES)
+
+    plan = plan_synthesis(input_dir, filename, output_dir, model, cache, batch_size, languages)
+    failed = 0
+    with AsyncWriter() as writer:
+        results = run_synthesis(model, plan.tasks, num_workers, threads_per_worker)
+        for (lang, mapped_lang, batch), result, error in results:
+            if error is not None:
+                line_nums = ", ".join(str(line_num) for line_num, _ in batch)
+                print(f"Error processing lines {line_nums} ({lang}): {str(error)}")
+                failed += len(batch)
+                continue
+
+            # Conversion and writes overlap with synthesis of the next batch
+            sample_rate, audios, stats = result
+            metrics.record_synthesis(lang, [audio.shape[-1] for audio in audios], sample_rate, stats)
+            for (line_num, cleaned_line), audio in zip(batch, audios):
+                writer.submit(
+                    (lang, line_num), save_line, plan, cache, lang, line_num, cleaned_line, sample_rate, audio
+                )
+
+        # Barrier: every clip is on disk before the manifest is saved
+        for (lang, line_num), error in writer.flush():
+            print(f"Error processing line {line_num} ({lang}): {str(error)}")
+            failed += 1
+
+    plan.save()
+    print_synthesis_summary(plan, model, cache)
+    return failed
 
 
 if __name__ == "__main__":
+    from ttsv.model import ZonosTTS
+
     # Create your ZonosTTS instance with desired paths
     zonos_tts = ZonosTTS(
         model_path="Zyphra/Zonos-v0.1-transformer", 
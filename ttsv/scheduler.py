@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from ttsv.config import CHANNEL_WORKERS
+
+
+def run_channels(
+    task: Callable[[str], object],
+    channels: Iterable[str],
+    max_workers: Optional[int] = CHANNEL_WORKERS,
+    label: str = "Channel"
+) -> Dict[str, dict]:
+    """
+    Run `task(channel)` for several channels concurrently, at most `max_workers`
+    at a time. A channel fails if its task raises or returns False; failures
+    don't affect the other channels. Prints a summary and returns
+    {channel: {"ok": bool, "seconds": float, "error": str or None}}.
+    """
+    channels = list(channels)
+    results = {}
+
+    def run(channel):
+        start = time.perf_counter()
+        try:
+            ok, error = task(channel) is not False, None
+        except Exception as e:
+            ok, error = False, str(e)
+        results[channel] = {"ok": ok, "seconds": time.perf_counter() - start, "error": error}
+
+    workers = max(1, min(max_workers or len(channels) or 1, len(channels) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, channels))
+
+    print(f"{label} summary:")
+    for channel in channels:
+        result = results[channel]
+        status = "ok" if result["ok"] else f"FAILED{': ' + result['error'] if result['error'] else ''}"
+        print(f"  {channel}: {status} ({result['seconds']:.1f}s)")
+    return results
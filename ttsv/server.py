@@ -0,0 +1,436 @@
+import os
+import json
+import time
+import queue
+import base64
+import socket
+import threading
+import collections
+import http.client
+import socketserver
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import urlparse
+import numpy as np
+from ttsv.metrics import log, metrics
+from ttsv.config import SERVER_ADDRESS, SERVER_MAX_BATCH, SERVER_BATCH_WAIT_MS, SERVER_DATA_ROOT
+
+
+class _Request:
+    __slots__ = ("text", "key", "seed", "future")
+
+    def __init__(self, text, key, seed):
+        self.text = text
+        self.key = key    # (language, speaker language): requests that can share a generate call
+        self.seed = seed
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Owns the model on a single thread and feeds it micro-batches: requests
+    that arrive within `max_wait_ms` of each other and share language and
+    speaker are synthesized with one `tts_batch` call of up to `max_batch`
+    lines. Each request keeps its own seed: models with `per_row_seeds` get
+    them row by row, otherwise lines with different seeds are synthesized
+    one at a time. Requests for other languages wait for the next batch.
+    """
+    def __init__(self, model, max_batch: int = SERVER_MAX_BATCH, max_wait_ms: float = SERVER_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._held = collections.deque()
+        self._thread = threading.Thread(target=self._run, name="ttsv-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str], language: str, speaker_lang: Optional[str] = None,
+               seeds: Optional[List[Optional[int]]] = None) -> List[Future]:
+        """
+        Queue lines for synthesis, `seeds[i]` seeding `texts[i]`; each future
+        resolves to a float waveform.
+        """
+        seeds = [None] * len(texts) if seeds is None else seeds
+        requests = [_Request(text, (language, speaker_lang or ""), seed) for text, seed in zip(texts, seeds)]
+        for request in requests:
+            self._queue.put(request)
+        return [request.future for request in requests]
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        first = self._held.popleft() if self._held else self._queue.get()
+        if first is None:
+            return None
+        batch = [request for request in self._held if request is not None and request.key == first.key]
+        batch = batch[: self.max_batch - 1]
+        for request in batch:
+            self._held.remove(request)
+        batch.insert(0, first)
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                self._held.append(None)  # stop once the held requests are served
+                break
+            (batch if request.key == first.key else self._held).append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            language, speaker_lang = batch[0].key
+            texts = [request.text for request in batch]
+            seeds = [request.seed for request in batch]
+            try:
+                self.model.language = language
+                if hasattr(self.model, "use_speaker_for"):
+                    self.model.use_speaker_for(speaker_lang)
+                start = time.perf_counter()
+                if len(texts) > 1 and None not in seeds and getattr(self.model, "per_row_seeds", False):
+                    audios = self.model.tts_batch(texts, seeds=seeds)
+                elif len(texts) > 1 and len(set(seeds)) == 1:
+                    audios = self.model.tts_batch(texts, **self._seed(seeds[0]))
+                else:
+                    audios = [self.model.tts(text, **self._seed(seed)) for text, seed in zip(texts, seeds)]
+                metrics.observe("server_batch_seconds", time.perf_counter() - start, lang=language)
+                metrics.observe("server_batch_size", len(texts), lang=language)
+                log.debug(f"Synthesized a batch of {len(texts)} line(s) ({language})")
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, audio in zip(batch, audios):
+                request.future.set_result(np.asarray(audio, dtype=np.float32).reshape(-1))
+
+    @staticmethod
+    def _seed(seed: Optional[int]) -> dict:
+        return {} if seed is None else {"seed": seed}
+
+
+def describe_model(model) -> dict:
+    """
+    What clients need to stand in for the model: sample rate and the model
+    path, seed, precision, token budget settings and speaker fingerprints
+    used in synthesis cache keys, so local and served runs share cache entries.
+    """
+    speakers = {"": model.load_speaker(model.reference_audio_path)[1]}
+    for lang, path in model.reference_audio_paths.items():
+        speakers[lang] = model.load_speaker(path)[1]
+    return {
+        "model_path": model.model_path,
+        "seed": model.seed,
+        "precision": getattr(model, "precision", "float32"),
+        "per_row_seeds": getattr(model, "per_row_seeds", False),
+        "token_budget_settings": getattr(model, "token_budget_settings", ""),
+        "sample_rate": model.synthesizer.output_sample_rate,
+        "speaker_fingerprints": speakers,
+    }
+
+
+class _ServedTTS(ABC):
+    """
+    Model-like front for a synthesis server, with the attributes
+    process_input_texts relies on (`tts`, `tts_batch`, `language`,
+    `use_speaker_for`, `synthesizer.output_sample_rate`). Subclasses send
+    the lines in `_synthesize`.
+    """
+    def __init__(self, info: dict, language: str = "en-us"):
+        self.info = info
+        self.model_path = info["model_path"]
+        self.seed = info["seed"]
+        self.precision = info["precision"]
+        self.per_row_seeds = info.get("per_row_seeds", False)
+        self.token_budget_settings = info.get("token_budget_settings", "")
+        self.language = language
+        self.speaker_lang = ""
+        self.speaker_fingerprint = info["speaker_fingerprints"][""]
+
+        class SynthesizerMock:
+            def __init__(self, sr: int):
+                self.output_sample_rate = sr
+
+        self.synthesizer = SynthesizerMock(info["sample_rate"])
+
+    def use_speaker_for(self, language: str):
+        fingerprints = self.info["speaker_fingerprints"]
+        self.speaker_lang = language if language in fingerprints else ""
+        self.speaker_fingerprint = fingerprints[self.speaker_lang]
+
+    def tts(self, text: str, speaker=None, seed: Optional[int] = None) -> np.ndarray:
+        return self._synthesize([text], [seed])[0]
+
+    def tts_batch(
+        self, texts: List[str], seed: Optional[int] = None, seeds: Optional[List[int]] = None
+    ) -> List[np.ndarray]:
+        return self._synthesize(list(texts), list(seeds) if seeds is not None else [seed] * len(texts))
+
+    @abstractmethod
+    def _synthesize(self, texts: List[str], seeds: List[Optional[int]]) -> List[np.ndarray]:
+        """Synthesize `texts` in the current language and speaker, each with its seed."""
+
+
+class QueuedTTS(_ServedTTS):
+    """_ServedTTS for jobs running inside the server: lines go straight to the batcher."""
+    def __init__(self, batcher: MicroBatcher, info: dict):
+        super().__init__(info)
+        self.batcher = batcher
+
+    def _synthesize(self, texts, seeds):
+        futures = self.batcher.submit(texts, self.language, self.speaker_lang, seeds)
+        return [future.result() for future in futures]
+
+
+class RemoteTTS(_ServedTTS):
+    """
+    _ServedTTS talking to a `main.py --serve` daemon at `url`
+    ("http://host:port" or "unix:///path/to/socket").
+    """
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        self.url = url
+        self.timeout = timeout
+        super().__init__(self._request("GET", "/health"))
+
+    def _connection(self):
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixHTTPConnection(parsed.path, timeout=self.timeout)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        connection = self._connection()
+        try:
+            payload = json.dumps(body).encode("utf-8") if body is not None else None
+            connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            result = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise RuntimeError(f"TTS server at {self.url} is unreachable: {e}") from e
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"TTS server error ({response.status}): {result.get('error', 'unknown error')}")
+        return result
+
+    def _synthesize(self, texts, seeds):
+        result = self._request("POST", "/synthesize", {
+            "texts": texts, "language": self.language, "speaker_lang": self.speaker_lang, "seeds": seeds
+        })
+        return [decode_audio(audio) for audio in result["audios"]]
+
+    def process(self, **job) -> dict:
+        """
+        Run process_input_texts on the server with the keyword arguments in
+        PROCESS_JOB_KEYS (paths relative to the server's SERVER_DATA_ROOT);
+        returns {"failed": n, "entries": [...]} with the manifest entries of
+        the processed languages.
+        """
+        return self._request("POST", "/process", job)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+# process_input_texts arguments a /process job may set; the server supplies the model and cache
+PROCESS_JOB_KEYS = ("input_dir", "filename", "output_dir", "batch_size", "languages")
+
+
+class BadRequest(ValueError):
+    """Invalid request body; answered with 400."""
+
+
+def _require(body: dict, name: str, kind: type):
+    value = body.get(name)
+    if not isinstance(value, kind):
+        raise BadRequest(f"'{name}' must be {kind.__name__}")
+    return value
+
+
+def _data_path(root: str, path) -> str:
+    """`path` resolved against `root`, refusing anything that ends up outside it."""
+    if not isinstance(path, str) or not path:
+        raise BadRequest(f"Invalid path {path!r}")
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise BadRequest(f"Path {path!r} is outside the server's data root")
+    return resolved
+
+
+def process_job(body: dict, root: str) -> dict:
+    """
+    Validate a /process body into process_input_texts keyword arguments:
+    only PROCESS_JOB_KEYS, paths inside `root`, plain file name, known languages.
+    """
+    from ttsv.config import INPUT_DIRECTORY, OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, LANGUAGES_TO_PROCESS
+    unknown = sorted(set(body) - set(PROCESS_JOB_KEYS))
+    if unknown:
+        raise BadRequest(f"Unknown job keys {unknown} (allowed: {', '.join(PROCESS_JOB_KEYS)})")
+    job = {
+        "input_dir": _data_path(root, body.get("input_dir", INPUT_DIRECTORY)),
+        "output_dir": _data_path(root, body.get("output_dir", OUTPUT_DIRECTORY)),
+        "filename": body.get("filename", FILENAME_TO_PROCESS),
+    }
+    if not isinstance(job["filename"], str) or os.path.basename(job["filename"]) != job["filename"] \
+            or job["filename"] in ("", ".", ".."):
+        raise BadRequest(f"Invalid filename {job['filename']!r}")
+    if "batch_size" in body:
+        batch_size = body["batch_size"]
+        if not isinstance(batch_size, int) or isinstance(batch_size, bool) or batch_size < 1:
+            raise BadRequest("'batch_size' must be a positive integer")
+        job["batch_size"] = batch_size
+    if body.get("languages") is not None:
+        languages = _require(body, "languages", list)
+        if not languages or any(lang not in LANGUAGES_TO_PROCESS for lang in languages):
+            raise BadRequest(f"'languages' must be a non-empty subset of {LANGUAGES_TO_PROCESS}")
+        job["languages"] = languages
+    return job
+
+
+def encode_audio(audio: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(audio, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_audio(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").astype(np.float32)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET  /health      model description (see describe_model)
+    POST /synthesize  {"texts", "language", "speaker_lang", "seeds"} -> {"audios": [base64 float32]}
+    POST /wav         {"text", "language", "speaker_lang"} -> audio/wav (int16)
+    POST /process     process_input_texts keyword arguments (see process_job) -> {"failed", "entries"}
+
+    Invalid bodies are answered with 400 and {"error"}.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.info)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        route = {"/synthesize": self._synthesize, "/wav": self._wav, "/process": self._process}.get(self.path)
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "Expected a JSON object"})
+            return
+        if route is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            route(body)
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            log.warning(f"Request to {self.path} failed: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _synthesize(self, body):
+        texts = _require(body, "texts", list)
+        seeds = body.get("seeds") or [body.get("seed")] * len(texts)
+        if len(seeds) != len(texts):
+            raise BadRequest("'seeds' must have one entry per text")
+        futures = self.server.batcher.submit(texts, body.get("language", "en-us"), body.get("speaker_lang"), seeds)
+        self._send_json(200, {"audios": [encode_audio(future.result()) for future in futures]})
+
+    def _wav(self, body):
+        import io
+        from scipy.io.wavfile import write as write_wav
+        from ttsv.process_file import to_int16
+        text = _require(body, "text", str)
+        [future] = self.server.batcher.submit([text], body.get("language", "en-us"), body.get("speaker_lang"))
+        buffer = io.BytesIO()
+        write_wav(buffer, self.server.info["sample_rate"], to_int16(future.result().copy()))
+        self._send(200, "audio/wav", buffer.getvalue())
+
+    def _process(self, body):
+        from ttsv.process_file import process_input_texts
+        from ttsv.manifest import Manifest, manifest_path
+        from ttsv.config import LANGUAGES_TO_PROCESS
+        job = process_job(body, self.server.data_root)
+        failed = process_input_texts(model=QueuedTTS(self.server.batcher, self.server.info), num_workers=1, **job)
+        languages = job.get("languages") or LANGUAGES_TO_PROCESS
+        manifest = Manifest.load(manifest_path(job["output_dir"], job["filename"]))
+        entries = [entry for (_, lang), entry in sorted(manifest.entries.items()) if lang in languages]
+        self._send_json(200, {"failed": failed, "entries": entries})
+
+    def _send_json(self, status, result):
+        self._send(status, "application/json", json.dumps(result, ensure_ascii=False).encode("utf-8"))
+
+    def _send(self, status, content_type, data: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(model, address: str = SERVER_ADDRESS, max_batch: int = SERVER_MAX_BATCH,
+                max_wait_ms: float = SERVER_BATCH_WAIT_MS, data_root: Optional[str] = SERVER_DATA_ROOT):
+    """
+    HTTP server for `model` on `address` ("http://host:port" or
+    "unix:///path/to/socket"), with its MicroBatcher attached. /process jobs
+    may only read and write under `data_root` (default: the working directory).
+    """
+    parsed = urlparse(address)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.remove(parsed.path)  # stale socket of a previous server
+        server = _UnixHTTPServer(parsed.path, _Handler)
+    else:
+        server = ThreadingHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8765), _Handler)
+        server.daemon_threads = True
+    server.data_root = os.path.realpath(data_root or os.getcwd())
+    server.info = describe_model(model)
+    server.batcher = MicroBatcher(model, max_batch, max_wait_ms)
+    return server
+
+
+def serve(model, address: str = SERVER_ADDRESS, max_batch: int = SERVER_MAX_BATCH,
+          max_wait_ms: float = SERVER_BATCH_WAIT_MS):
+    """Keep `model` loaded and serve synthesis requests until interrupted."""
+    server = make_server(model, address, max_batch, max_wait_ms)
+    print(f"Serving TTS on {address} (batches of up to {max_batch}, {max_wait_ms:g} ms wait)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+        metrics.print_summary()
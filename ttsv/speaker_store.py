@@ -0,0 +1,44 @@
+import os
+import hashlib
+import torch
+
+
+class SpeakerEmbeddingStore:
+    """
+    On-disk store of speaker embeddings, keyed by a hash of the reference audio
+    file and the model id, so `make_speaker_embedding` only runs once per clip.
+    """
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(reference_audio_path: str, model_id: str) -> str:
+        """Hash the reference audio content together with the model id."""
+        digest = hashlib.sha256()
+        with open(reference_audio_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\x1f" + model_id.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.pt")
+
+    def load(self, key: str, device="cpu"):
+        """Return the stored embedding on `device`, or None if it isn't stored."""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            return torch.load(path, map_location=device)
+        except Exception as e:
+            print(f"WARNING: Could not load speaker embedding {path}: {e}")
+            return None
+
+    def save(self, key: str, embedding: torch.Tensor):
+        """Atomically write an embedding to the store."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(embedding.detach().cpu(), tmp_path)
+        os.replace(tmp_path, path)
@@ -0,0 +1,295 @@
+import os
+import glob
+import json
+import hashlib
+import threading
+from itertools import groupby
+from ttsv import config
+from ttsv.manifest import Manifest, manifest_path
+
+STATE_NAME = ".ttsv_state.json"
+
+
+def state_path(output_dir: str = config.OUTPUT_DIRECTORY, filename: str = config.FILENAME_TO_PROCESS) -> str:
+    """
+    Location of the runner state for a document: output/{filename}/.ttsv_state.json
+    """
+    return os.path.join(output_dir, filename, STATE_NAME)
+
+
+def _document_path(name: str) -> str:
+    return os.path.join(config.OUTPUT_DIRECTORY, config.FILENAME_TO_PROCESS, name)
+
+
+class Unit:
+    """
+    One independently rebuildable piece of a step: a language for step 1,
+    a channel for steps 2-4. `inputs` returns a list of things the unit depends
+    on (file paths and plain values), `outputs` the files it produces, and
+    `run` does the work, returning something falsy on failure.
+    """
+    def __init__(self, step, name, inputs, outputs, run, upstream=()):
+        self.step = step
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.upstream = tuple(upstream)
+
+    @property
+    def key(self) -> str:
+        return f"{self.step}:{self.name}"
+
+
+class StepRunner:
+    """
+    Runs pipeline units, skipping those whose input fingerprints match the
+    last successful run and whose recorded outputs are still intact.
+
+    File fingerprints are content hashes, memoized by (size, mtime) in the
+    state file so unchanged files aren't re-read.
+    """
+    def __init__(self, path: str, force: bool = False):
+        self.path = path
+        self.force = force
+        self._lock = threading.RLock()
+        self.state = {"units": {}, "files": {}}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"WARNING: Ignoring unreadable runner state {path}: {e}")
+
+    def fingerprint_file(self, path: str):
+        """Content hash of a file, or None if it doesn't exist."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        memo = self.state["files"].get(path)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.state["files"][path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def fingerprint_inputs(self, unit: Unit) -> str:
+        """Hash of a unit's inputs; strings naming existing files are hashed by content."""
+        parts = []
+        for item in unit.inputs():
+            if isinstance(item, str) and os.path.isfile(item):
+                parts.append(["file", item, self.fingerprint_file(item)])
+            else:
+                parts.append(["value", item])
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def reason_to_run(self, unit: Unit):
+        """Why `unit` needs to run, or None if it is up to date."""
+        if self.force:
+            return "forced"
+        record = self.state["units"].get(unit.key)
+        if record is None:
+            return "never built"
+        if record["inputs"] != self.fingerprint_inputs(unit):
+            return "inputs changed"
+        for path, fingerprint in record["outputs"].items():
+            if self.fingerprint_file(path) != fingerprint:
+                return f"output changed: {path}"
+        return None
+
+    def record(self, unit: Unit):
+        """Remember the inputs and outputs of a successful run."""
+        with self._lock:
+            self.state["units"][unit.key] = {
+                "inputs": self.fingerprint_inputs(unit),
+                "outputs": {path: self.fingerprint_file(path) for path in unit.outputs()},
+            }
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def plan(self, units):
+        """
+        Return [(unit, reason)] for units that would run. A unit whose upstream
+        unit is going to run is assumed stale too.
+        """
+        planned, stale = [], set()
+        for unit in units:
+            reason = self.reason_to_run(unit)
+            if reason is None and any(key in stale for key in unit.upstream):
+                reason = "upstream will change"
+            if reason is not None:
+                stale.add(unit.key)
+                planned.append((unit, reason))
+        return planned
+
+    def print_plan(self, units):
+        planned = dict((unit.key, reason) for unit, reason in self.plan(units))
+        for unit in units:
+            status = f"run ({planned[unit.key]})" if unit.key in planned else "up to date"
+            print(f"  [Step {unit.step}] {unit.name}: {status}")
+
+    def run(self, units):
+        """
+        Run stale units step by step, recording each one that succeeds. Step 1
+        units share the model and run in order; the per-channel units of later
+        steps run concurrently through the channel scheduler.
+        """
+        from ttsv.scheduler import run_channels
+
+        for step, step_units in groupby(units, key=lambda unit: unit.step):
+            stale = {}
+            for unit in step_units:
+                reason = self.reason_to_run(unit)
+                if reason is None:
+                    print(f"[Step {unit.step}] {unit.name}: up to date, skipping")
+                else:
+                    print(f"[Step {unit.step}] {unit.name}: running ({reason})")
+                    stale[unit.name] = unit
+            if not stale:
+                continue
+
+            def run_unit(name, stale=stale):
+                unit = stale[name]
+                if not unit.run():
+                    print(f"[Step {unit.step}] {unit.name}: failed, not recorded")
+                    return False
+                self.record(unit)
+                return True
+
+            if step == 1:
+                for name in stale:
+                    run_unit(name)
+            else:
+                run_channels(run_unit, stale, label=f"[Step {step}]")
+
+
+def _manifest_inputs(langs):
+    """Text, length and clip fingerprint of every manifest record for `langs`."""
+    manifest = Manifest.load(manifest_path(config.OUTPUT_DIRECTORY, config.FILENAME_TO_PROCESS))
+    items, clip_paths = [], {}
+    for lang in langs:
+        for line_num, entry in sorted(manifest.for_language(lang).items()):
+            items.append([line_num, lang, entry["text"], entry["samples"], entry["sample_rate"], entry.get("offset")])
+            # A packed store holds every clip of a language: fingerprint it once
+            clip_paths[manifest.clip_path(entry)] = None
+    return items + list(clip_paths)
+
+
+def build_units(steps, get_model):
+    """
+    Units for the requested steps (1-4), in dependency order. `get_model` is
+    only called if a step 1 unit actually runs.
+    """
+    units = []
+    channel_langs = {channel: [channel, "en"] for channel in config.CHANNEL_TO_UPLOAD}
+
+    if 1 in steps:
+        for lang in config.LANGUAGES_TO_PROCESS:
+            def run(lang=lang):
+                from ttsv.process_file import process_input_texts
+                return process_input_texts(
+                    input_dir=config.INPUT_DIRECTORY, filename=config.FILENAME_TO_PROCESS,
+                    model=get_model(), languages=[lang]
+                ) == 0
+
+            def inputs(lang=lang):
+                return [
+                    os.path.join(config.INPUT_DIRECTORY, f"{config.FILENAME_TO_PROCESS}-{lang}.txt"),
+                    config.MODEL_PATH,
+                    config.REFERENCE_AUDIO_PATHS.get(lang, config.REFERENCE_AUDIO_PATH),
+                    [config.TTS_BATCH_SIZE, config.USE_CHUNKING, config.MAX_CHARS_PER_LINE,
+                     config.CHUNK_CROSSFADE_MS, config.TTS_SEED, sorted(config.TTS_ACCELERATION)],
+                    [config.USE_TOKEN_BUDGET, config.PHONEMES_PER_SECOND, config.TOKEN_BUDGET_MARGIN,
+                     config.TOKEN_BUDGET_MIN_SECONDS, config.TOKEN_BUDGET_MAX_SECONDS,
+                     config.TOKEN_BUDGET_RETRY_FACTOR],
+                ]
+
+            def outputs(lang=lang):
+                return [item for item in _manifest_inputs([lang]) if isinstance(item, str)]
+
+            units.append(Unit(1, lang, inputs, outputs, run))
+
+    for channel, langs in channel_langs.items():
+        merged_wav = _document_path(f"{config.FILENAME_TO_PROCESS}-{channel}-merged.wav")
+        video = _document_path(f"{config.FILENAME_TO_PROCESS}-{channel}.mp4")
+
+        def subtitles(channel=channel):
+            pattern = _document_path(f"{config.FILENAME_TO_PROCESS}-{channel}-*")
+            return sorted(p for p in glob.glob(pattern) if p.endswith((".txt", ".sbv")))
+
+        def video_settings():
+            return [
+                config.VIDEO_RESOLUTION, config.VIDEO_FPS,
+                config.VIDEO_BACKGROUND_COLOR, config.VIDEO_CODEC, config.AUDIO_CODEC,
+                config.VIDEO_PRESET, config.VIDEO_CRF,
+                config.VIDEO_ENCODING_PROFILES[config.VIDEO_ENCODING_PROFILE]
+            ]
+
+        # In fused mode step 2 also produces the video and step 3 has nothing to do
+        fused = config.FUSED_MERGE_ENCODE
+
+        def merge_outputs(merged_wav=merged_wav, video=video, subtitles=subtitles, fused=fused):
+            outputs = subtitles()
+            if not fused or config.KEEP_MERGED_WAV:
+                outputs.append(merged_wav)
+            if fused:
+                outputs.append(video)
+            return outputs
+
+        if 2 in steps or (fused and 3 in steps):
+            def run_merge(channel=channel):
+                from ttsv.merge import process_channel
+                return process_channel(channel)
+
+            units.append(Unit(
+                2, channel,
+                inputs=lambda langs=langs, channel=channel, fused=fused: _manifest_inputs(langs) + [
+                    config.REPETITION_PATTERN_WAVE, config.REPETITION_PATTERN_TEXT.get(channel)
+                ] + ([fused, config.KEEP_MERGED_WAV] + video_settings() if fused else []),
+                outputs=merge_outputs,
+                run=run_merge,
+                upstream=[f"1:{lang}" for lang in langs],
+            ))
+
+        if 3 in steps and not fused:
+            def run_video(channel=channel):
+                from ttsv.generate_video import create_black_video
+                return create_black_video(channel)
+
+            units.append(Unit(
+                3, channel,
+                inputs=lambda merged_wav=merged_wav: [merged_wav] + video_settings() + [
+                    config.VIDEO_SEGMENTED_ENCODE, config.VIDEO_SEGMENT_SECONDS
+                ],
+                outputs=lambda video=video: [video],
+                run=run_video,
+                upstream=[f"2:{channel}"],
+            ))
+
+        if 4 in steps:
+            def run_upload(channel=channel):
+                from ttsv.youtube_upload import process_channel
+                return process_channel(channel)
+
+            units.append(Unit(
+                4, channel,
+                inputs=lambda video=video, subtitles=subtitles, channel=channel: [video] + [
+                    p for p in subtitles() if p.endswith(".sbv")
+                ] + [config.CHANNEL_METADATA.get(channel)],
+                outputs=lambda: [],
+                run=run_upload,
+                upstream=[f"2:{channel}" if fused else f"3:{channel}"],
+            ))
+
+    # Keep step order across channels: all of step 2 before step 3, etc.
+    return sorted(units, key=lambda unit: unit.step)
@@ -0,0 +1,141 @@
+import os
+import filecmp
+import hashlib
+import shutil
+import wave
+import threading
+from typing import Optional
+import numpy as np
+from scipy.io.wavfile import read as read_wav, write as write_wav
+
+
+class SynthesisCache:
+    """
+    A persistent, content-addressed cache of synthesized lines.
+
+    Entries are stored as int16 WAV files named after a hash of everything that
+    influences the model output (cleaned text, language code, model path, seed and
+    speaker embedding). Least recently used entries are evicted once the cache grows
+    beyond `max_bytes`, down to `low_water` of it, so a full cache is only
+    rescanned every few hundred stores rather than on each one.
+    """
+    low_water = 0.9
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def make_key(text: str, language: str, model, chunking: Optional[tuple] = None) -> str:
+        """
+        Build the cache key for a line synthesized by `model` in `language`.
+        Models that don't expose a path, seed or speaker fingerprint fall back to
+        their class name so that different backends never share entries.
+        Reduced-precision models (see TTSModel.precision) get their own entries,
+        as do token budget settings (TTSModel.token_budget_settings) and lines
+        synthesized in chunks, per their `chunking` settings (see
+        process_file.chunking_settings).
+        """
+        parts = [
+            text,
+            language,
+            str(getattr(model, "model_path", type(model).__name__)),
+            str(getattr(model, "seed", "")),
+            str(getattr(model, "speaker_fingerprint", "")),
+        ]
+        precision = getattr(model, "precision", "float32")
+        if precision != "float32":
+            parts.append(precision)
+        budget = getattr(model, "token_budget_settings", "")
+        if budget:
+            parts.append(budget)
+        if chunking is not None:
+            parts.append("chunks:" + ",".join(str(value) for value in chunking))
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every entry in the cache."""
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if not fname.endswith(".wav"):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def lookup(self, key: str):
+        """
+        Return (path, sample_rate, num_samples) for a cached entry, or None.
+        A hit refreshes the entry's modification time for LRU eviction.
+        """
+        path = self._path(key)
+        try:
+            with wave.open(path, "rb") as wf:
+                sample_rate, num_samples = wf.getframerate(), wf.getnframes()
+            os.utime(path)
+        except (OSError, wave.Error, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path, sample_rate, num_samples
+
+    def copy_to(self, key: str, destination: str) -> bool:
+        """
+        Copy a cached entry to `destination`, unless an identical file is
+        already there. Returns False on a miss.
+        """
+        path = self._path(key)
+        try:
+            if not (os.path.isfile(destination) and filecmp.cmp(path, destination, shallow=False)):
+                shutil.copyfile(path, destination)
+        except OSError:
+            return False
+        return True
+
+    def read(self, key: str):
+        """Return (sample_rate, int16 audio) of a cached entry, or None on a miss."""
+        try:
+            return read_wav(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, sample_rate: int, int16_audio: np.ndarray):
+        """Atomically add an entry, then evict old entries if over budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        write_wav(tmp_path, sample_rate, int16_audio)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes += os.path.getsize(path) - replaced
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in `low_water * max_bytes`."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.low_water
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._total_bytes = total
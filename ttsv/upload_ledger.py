@@ -0,0 +1,60 @@
+import os
+import json
+import hashlib
+import threading
+from ttsv.config import OUTPUT_DIRECTORY, FILENAME_TO_PROCESS
+
+UPLOAD_LEDGER_PATH = os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, ".upload_ledger.json")
+
+
+def hash_file(path):
+    """sha256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_metadata(metadata):
+    """Stable hash of a JSON-serializable metadata dict."""
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class UploadLedger:
+    """
+    Local record of what has been published, per channel:
+
+        {channel: {"video_id", "video_hash", "metadata_hash",
+                   "captions": {lang: {"caption_id", "hash"}}}}
+
+    Lets the uploader skip unchanged videos and captions, update changed
+    captions and metadata in place, and only upload genuinely new videos.
+    """
+    def __init__(self, path=UPLOAD_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"WARNING: Ignoring unreadable upload ledger {self.path}: {e}")
+            return {}
+
+    def get(self, channel):
+        with self._lock:
+            return self._load().get(channel)
+
+    def set(self, channel, record):
+        """Store a channel's record (read-modify-write, safe across channel threads)."""
+        with self._lock:
+            ledger = self._load()
+            ledger[channel] = record
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(ledger, f, indent=1)
+            os.replace(tmp_path, self.path)
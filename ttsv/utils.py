@@ -1,14 +1,5 @@
 import os
 import re
-import torch
-import numpy as np
-from scipy.io.wavfile import write as write_wav, read as read_wav
-from ttsv.config import LANGUAGES_TO_PROCESS, OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, \
-                  LANG_MODEL_MAP, ROOT_DIRECTORY, USE_CHUNKING, MAX_CHARS_PER_LINE
-
-device = "cuda" if torch.cuda.is_available() else "cpu"
-_tts_objects = {}  # Stores TTS instances with speaker configurations
-
 
 
 def format_timestamp(total_seconds):
@@ -0,0 +1,52 @@
+import os
+import multiprocessing as mp
+from typing import List, Optional
+import torch
+from ttsv.process_file import synthesize_task
+
+# Set in the parent right before forking, so every worker inherits the already
+# loaded weights copy-on-write instead of loading its own copy.
+_worker_model = None
+
+
+def can_use_worker_pool(model) -> bool:
+    """
+    The pool forks the loaded model into its workers, which needs the 'fork'
+    start method and a model living on the CPU.
+    """
+    device = str(getattr(model, "use_device", "cpu"))
+    return "fork" in mp.get_all_start_methods() and device.startswith("cpu")
+
+
+def _init_worker(num_threads: int):
+    torch.set_num_threads(num_threads)
+
+
+def _run_task(task: tuple):
+    try:
+        return task, synthesize_task(_worker_model, task), None
+    except Exception as e:
+        return task, None, RuntimeError(str(e))
+
+
+def run_tasks_in_pool(model, tasks: List[tuple], num_workers: int, threads_per_worker: Optional[int] = None):
+    """
+    Yield (task, result, error) for each work item as workers finish them.
+    Each of the `num_workers` forked processes owns its copy of `model` and
+    uses `threads_per_worker` torch threads.
+    """
+    global _worker_model
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+    # Longest batches first, so the pool doesn't end on a single slow item
+    ordered = sorted(tasks, key=lambda task: sum(len(text) for _, text in task[2]), reverse=True)
+
+    _worker_model = model
+    try:
+        with mp.get_context("fork").Pool(
+            num_workers, initializer=_init_worker, initargs=(threads_per_worker,)
+        ) as pool:
+            yield from pool.imap_unordered(_run_task, ordered)
+    finally:
+        _worker_model = None
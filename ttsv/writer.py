@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+from ttsv.config import WRITER_THREADS, WRITER_MAX_PENDING
+
+
+class AsyncWriter:
+    """
+    Bounded background pool for post-processing and writing synthesized
+    audio, so the model can start on the next batch while the previous one
+    is converted and written to disk.
+
+    `submit` blocks once `max_pending` jobs are queued or running, which keeps
+    memory bounded when the disk falls behind. `flush` is a barrier: it waits
+    until every submitted job has finished and returns the (key, error) pairs
+    of the jobs that failed since the last flush.
+    """
+    def __init__(self, threads: int = WRITER_THREADS, max_pending: int = WRITER_MAX_PENDING):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="ttsv-writer")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._futures = []
+        self._errors = []
+
+    def submit(self, key, fn: Callable, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` in the background; `key` identifies the job in errors."""
+        self._slots.acquire()
+
+        def job():
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                with self._lock:
+                    self._errors.append((key, e))
+            finally:
+                self._slots.release()
+
+        future = self._pool.submit(job)
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+        return future
+
+    def flush(self) -> List[Tuple[object, Exception]]:
+        """Wait for every submitted job; return and clear the failures."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def close(self):
+        errors = self.flush()
+        self._pool.shutdown(wait=True)
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
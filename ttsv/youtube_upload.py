@@ -1,15 +1,24 @@
 import os
 import glob
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build, MediaFileUpload
-from google.colab import userdata
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from ttsv import config
 from ttsv.config import (
     OUTPUT_DIRECTORY,
     FILENAME_TO_PROCESS,
     CHANNEL_TO_UPLOAD,
-    CHANNEL_METADATA
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_MAX_RETRIES,
+    UPLOAD_BACKOFF_MAX_SECONDS,
+    CAPTION_UPLOAD_WORKERS,
 )
+from ttsv.scheduler import run_channels
+from ttsv.upload_ledger import UploadLedger, hash_file, hash_metadata
+
 env_path = ".env"
 load_dotenv(dotenv_path=env_path)
 
@@ -20,75 +29,305 @@ YOUTUBE_SCOPES =[    "https://www.googleapis.com/auth/youtube.force-ssl",
     "https://www.googleapis.com/auth/youtube"]
 API_SERVICE_NAME = "youtube"
 API_VERSION = "v3"
+# Overridable so uploads can be exercised against a local fake server
+API_ROOT_URL = os.getenv("YOUTUBE_API_ROOT_URL")
+TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI", "https://oauth2.googleapis.com/token")
+UPLOAD_SESSIONS_PATH = os.path.join(OUTPUT_DIRECTORY, FILENAME_TO_PROCESS, ".upload_sessions.json")
+RETRIABLE_STATUS_CODES = {500, 502, 503, 504}
+
+_youtube_services = {}  # channel -> (service, credentials), reused across calls
+_services_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def get_secret(name):
+    """Read a secret from the environment (.env) or, on Colab, from userdata."""
+    value = os.getenv(name)
+    if not value:
+        try:
+            from google.colab import userdata  # Colab secrets, when running on Colab
+            value = userdata.get(name)
+        except Exception:
+            value = None
+    return value
 
 def get_youtube_service(channel_lang):
-    """Create YouTube service using credentials for the specified channel."""
-    print(os.getenv(f"YOUTUBE_ACCESS_TOKEN_{channel_lang.upper()}")
-    )
-    return build(
-        API_SERVICE_NAME,
-        API_VERSION,
-        credentials=Credentials(
-            token=os.getenv(f"YOUTUBE_ACCESS_TOKEN_{channel_lang.upper()}"),
-            refresh_token=os.getenv(f"YOUTUBE_REFRESH_TOKEN_{channel_lang.upper()}"),
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=os.getenv(f"GOOGLE_CLIENT_ID_{channel_lang.upper()}"),
-            client_secret=os.getenv(f"GOOGLE_CLIENT_SECRET_{channel_lang.upper()}"),
-            scopes=YOUTUBE_SCOPES
-        )
+    """
+    Return the YouTube service for the specified channel, building it once from
+    the bundled static discovery document (no discovery HTTP round trip).
+    """
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
+    with _services_lock:
+        if channel_lang not in _youtube_services:
+            credentials = Credentials(
+                token=get_secret(f"YOUTUBE_ACCESS_TOKEN_{channel_lang.upper()}"),
+                refresh_token=get_secret(f"YOUTUBE_REFRESH_TOKEN_{channel_lang.upper()}"),
+                token_uri=TOKEN_URI,
+                client_id=get_secret(f"GOOGLE_CLIENT_ID_{channel_lang.upper()}"),
+                client_secret=get_secret(f"GOOGLE_CLIENT_SECRET_{channel_lang.upper()}"),
+                scopes=YOUTUBE_SCOPES
+            )
+            service = build(
+                API_SERVICE_NAME,
+                API_VERSION,
+                credentials=credentials,
+                static_discovery=True,
+                cache_discovery=False,
+                client_options={"api_endpoint": API_ROOT_URL} if API_ROOT_URL else None
+            )
+            _youtube_services[channel_lang] = (service, credentials)
+        return _youtube_services[channel_lang][0]
+
+def thread_http(channel_lang):
+    """
+    Authorized HTTP connection for the calling thread. httplib2 connections are
+    not thread-safe, so concurrent requests on a shared service each pass their own.
+    Built like the service's own (60s timeout, resumable upload 308s not followed
+    as redirects).
+    """
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+
+    get_youtube_service(channel_lang)
+    cache = getattr(_thread_local, "http", None)
+    if cache is None:
+        cache = _thread_local.http = {}
+    if channel_lang not in cache:
+        credentials = _youtube_services[channel_lang][1]
+        cache[channel_lang] = AuthorizedHttp(credentials, http=build_http())
+    return cache[channel_lang]
+
+
+class UploadSessionStore:
+    """
+    Persists resumable upload session URIs, so an interrupted upload continues
+    where it stopped after a crash instead of starting over.
+    """
+    def __init__(self, path=UPLOAD_SESSIONS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, sessions):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sessions, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            sessions = self._load()
+            sessions[key] = value
+            self._save(sessions)
+
+    def pop(self, key):
+        with self._lock:
+            sessions = self._load()
+            if sessions.pop(key, None) is not None:
+                self._save(sessions)
+
+
+def transport_errors():
+    """Network failures of the Google API client worth reporting or retrying."""
+    import httplib2
+    return (httplib2.HttpLib2Error, ConnectionError, TimeoutError)
+
+def backoff_sleep(attempt):
+    """Exponential backoff with jitter: ~1s, 2s, 4s, ... capped at UPLOAD_BACKOFF_MAX_SECONDS."""
+    delay = min(UPLOAD_BACKOFF_MAX_SECONDS, 2 ** attempt) * random.uniform(0.5, 1.0)
+    print(f"  Retrying in {delay:.1f}s...")
+    time.sleep(delay)
+
+def file_signature(file_path):
+    """Size and mtime, enough to tell whether a saved session still matches the file."""
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns]
+
+def video_body(metadata):
+    """Snippet and status sent for a channel's video."""
+    return {
+        "snippet": {
+            "title": metadata["VIDEO_TITLE"],
+            "description": metadata["VIDEO_DESCRIPTION"],
+            "tags": metadata["VIDEO_TAGS"],
+            "categoryId": "22"
+        },
+        "status": {"privacyStatus": "public"}
+    }
+
+def update_video_metadata(youtube, video_id, metadata, http=None):
+    """Update title, description, tags and status of an already uploaded video."""
+    youtube.videos().update(
+        part="snippet,status",
+        body={"id": video_id, **video_body(metadata)}
+    ).execute(http=http, num_retries=UPLOAD_MAX_RETRIES)
+    print(f"✅ Updated metadata of {video_id}")
+
+def query_upload_status(http, session_uri, size):
+    """
+    Ask a resumable upload session how much of a `size`-byte file it has
+    received: an empty PUT with `Content-Range: bytes */<size>`. Returns
+    (bytes received, response) where response is the finished upload's
+    resource once all bytes are in, else None. Raises HttpError for any
+    other answer, e.g. 404/410 for an expired session.
+    """
+    from googleapiclient.errors import HttpError
+
+    resp, content = http.request(
+        session_uri, method="PUT", body=b"", headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"}
     )
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status == 308:
+        received = resp.get("range")  # "bytes=0-<last byte>", absent when nothing arrived
+        return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+    raise HttpError(resp, content, uri=session_uri)
+
+def upload_video(youtube, file_path, metadata, http=None, sessions=None, session_key=None):
+    """
+    Upload video to YouTube with channel-specific metadata, in UPLOAD_CHUNK_SIZE
+    chunks with retries and exponential backoff. If `sessions` is given, the
+    upload session URI is persisted under `session_key` and reused on the next
+    call, so an interrupted upload resumes instead of restarting.
+    """
+    from googleapiclient.http import MediaFileUpload
+    from googleapiclient.errors import HttpError
 
-def upload_video(youtube, file_path, metadata):
-    """Upload video to YouTube with channel-specific metadata."""
+    retriable_exceptions = transport_errors()
+    session_key = session_key or os.path.abspath(file_path)
     request = youtube.videos().insert(
         part="snippet,status",
-        body={
-            "snippet": {
-                "title": metadata["VIDEO_TITLE"],
-                "description": metadata["VIDEO_DESCRIPTION"],
-                "tags": metadata["VIDEO_TAGS"],
-                "categoryId": "22"
-            },
-            "status": {"privacyStatus": "public"}
-        },
-        media_body=MediaFileUpload(file_path, chunksize=-1, resumable=True)
+        body=video_body(metadata),
+        media_body=MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
     )
-    response = request.execute()
+
+    http = http or request.http
+    size = os.path.getsize(file_path)
+    signature = file_signature(file_path)
+    saved = sessions.get(session_key) if sessions else None
+    resumed = bool(saved and saved.get("signature") == signature)
+    if resumed:
+        print(f"  Resuming upload session for {file_path}")
+        request.resumable_uri = saved["uri"]
+
+    # Whether to ask the server how much it has before sending the next chunk
+    sync = resumed
+    response, attempt = None, 0
+    while response is None:
+        try:
+            if sync and request.resumable_uri:
+                request.resumable_progress, response = query_upload_status(http, request.resumable_uri, size)
+                sync = False
+                if response is not None:
+                    break
+            status, response = request.next_chunk(http=http)
+            attempt = 0
+            if sessions and request.resumable_uri and not resumed:
+                sessions.set(session_key, {"uri": request.resumable_uri, "signature": signature})
+                resumed = True
+            if status:
+                print(f"  Uploaded {int(status.progress() * 100)}%")
+        except HttpError as e:
+            if e.resp.status in (404, 410) and saved:
+                # The saved session expired: start a fresh upload
+                sessions.pop(session_key)
+                return upload_video(youtube, file_path, metadata, http, sessions, session_key)
+            if e.resp.status not in RETRIABLE_STATUS_CODES or attempt >= UPLOAD_MAX_RETRIES:
+                raise
+            attempt += 1
+            print(f"  Upload error {e.resp.status}")
+            sync = True
+            backoff_sleep(attempt)
+        except retriable_exceptions as e:
+            if attempt >= UPLOAD_MAX_RETRIES:
+                raise
+            attempt += 1
+            print(f"  Connection error: {e}")
+            sync = True
+            backoff_sleep(attempt)
+
+    if sessions:
+        sessions.pop(session_key)
     print(f"✅ Uploaded: {response['id']}")
     return response['id']
 
-def upload_subtitles(youtube, video_id, subtitle_files):
-    """Upload subtitle files for the video."""
-    for sub_path in subtitle_files:
+def subtitle_language(sub_path):
+    """Extract language code from filename (e.g., "es" from "Pizza-es-es.sbv")."""
+    return os.path.basename(sub_path).split("-")[-1].replace(".sbv", "")
+
+def upload_subtitle(youtube, video_id, sub_path, http=None, caption_id=None):
+    """
+    Upload one subtitle file for the video, replacing the track `caption_id`
+    in place when given. Returns the caption id.
+    """
+    from googleapiclient.http import MediaFileUpload
+
+    lang = subtitle_language(sub_path)
+    snippet = {
+        "videoId": video_id,
+        "language": lang,
+        "name": f"Subtitles ({lang.upper()})",
+        "isDraft": False
+    }
+    media_body = MediaFileUpload(sub_path, mimetype="text/plain")
+    if caption_id:
+        request = youtube.captions().update(
+            part="snippet", body={"id": caption_id, "snippet": snippet}, media_body=media_body
+        )
+    else:
+        request = youtube.captions().insert(part="snippet", body={"snippet": snippet}, media_body=media_body)
+    response = request.execute(http=http, num_retries=UPLOAD_MAX_RETRIES)
+    print(f"✅ {'Updated' if caption_id else 'Added'} {lang.upper()} subtitles")
+    return response.get("id", caption_id)
+
+def upload_subtitles(youtube, video_id, subtitle_files, channel_lang=None, caption_ids=None):
+    """
+    Upload subtitle files for the video concurrently. `caption_ids` maps a
+    file path to an existing caption to update instead of inserting.
+    Returns {path: caption id} for the files that were uploaded.
+    """
+    from googleapiclient.errors import HttpError
+
+    caption_ids = caption_ids or {}
+    upload_errors = (HttpError, *transport_errors())
+
+    def upload(sub_path):
         try:
-            # Extract language code from filename (e.g., "es" from "Pizza-es-es.sbv")
-            lang = os.path.basename(sub_path).split("-")[-1].replace(".sbv", "")
-            
-            youtube.captions().insert(
-                part="snippet",
-                body={
-                    "snippet": {
-                        "videoId": video_id,
-                        "language": lang,
-                        "name": f"Subtitles ({lang.upper()})",
-                        "isDraft": False
-                    }
-                },
-                media_body=MediaFileUpload(sub_path, mimetype="text/plain")
-            ).execute()
-            print(f"✅ Added {lang.upper()} subtitles")
-        except Exception as e:
+            http = thread_http(channel_lang) if channel_lang else None
+            caption_id = caption_ids.get(sub_path)
+            return sub_path, upload_subtitle(youtube, video_id, sub_path, http=http, caption_id=caption_id)
+        except upload_errors as e:
             print(f"⚠️ Failed to upload subtitles {sub_path}: {str(e)}")
+            return sub_path, None
+
+    with ThreadPoolExecutor(max_workers=max(1, CAPTION_UPLOAD_WORKERS)) as pool:
+        results = list(pool.map(upload, subtitle_files))
+    return {path: caption_id for path, caption_id in results if caption_id}
 
 def process_channel(channel):
-    """Handle video and subtitle upload for a single channel."""
+    """Handle video and subtitle upload for a single channel. Returns the video id."""
     print(f"\n=== Processing {channel.upper()} channel ===")
-    
+
     # Get metadata
-    metadata = CHANNEL_METADATA.get(channel)
+    metadata = config.CHANNEL_METADATA.get(channel)
     if not metadata:
         print(f"❌ No metadata found for {channel}")
-        return
+        return None
 
     # File paths
     video_path = os.path.join(
@@ -102,25 +341,58 @@ def process_channel(channel):
 
     if not os.path.exists(video_path):
         print(f"❌ Video file missing: {video_path}")
-        return
+        return None
+
+    # Compare against what was published last time
+    ledger = UploadLedger()
+    record = ledger.get(channel)
+    video_hash = hash_file(video_path)
+    metadata_hash = hash_metadata(video_body(metadata))
 
-    # Initialize service and upload
+    # Reuse the channel's service and upload
     youtube = get_youtube_service(channel)
-    video_id = upload_video(youtube, video_path, metadata)
-    
-    # Upload subtitles if available
+    if record and record.get("video_hash") == video_hash:
+        video_id = record["video_id"]
+        if record.get("metadata_hash") != metadata_hash:
+            update_video_metadata(youtube, video_id, metadata, http=thread_http(channel))
+        else:
+            print(f"⏭️ Video unchanged, already published as {video_id}")
+    else:
+        video_id = upload_video(
+            youtube, video_path, metadata,
+            http=thread_http(channel), sessions=UploadSessionStore(), session_key=f"{channel}:{video_path}"
+        )
+        record = {"captions": {}}  # captions belonged to the previous video
+    record.update({"video_id": video_id, "video_hash": video_hash, "metadata_hash": metadata_hash})
+    ledger.set(channel, record)
+
+    # Upload new or changed subtitles
     if subtitle_files:
-        upload_subtitles(youtube, video_id, subtitle_files)
+        captions = record.setdefault("captions", {})
+        to_upload, caption_ids, hashes = [], {}, {}
+        for sub_path in subtitle_files:
+            lang = subtitle_language(sub_path)
+            hashes[sub_path] = hash_file(sub_path)
+            known = captions.get(lang)
+            if known and known["hash"] == hashes[sub_path]:
+                continue
+            to_upload.append(sub_path)
+            if known:
+                caption_ids[sub_path] = known["caption_id"]
+        if to_upload:
+            uploaded = upload_subtitles(youtube, video_id, to_upload, channel_lang=channel, caption_ids=caption_ids)
+            for sub_path, caption_id in uploaded.items():
+                captions[subtitle_language(sub_path)] = {"caption_id": caption_id, "hash": hashes[sub_path]}
+            ledger.set(channel, record)
+        else:
+            print(f"⏭️ Subtitles unchanged for {channel}")
     else:
         print(f"⚠️ No subtitle files found for {channel}")
+    return video_id
 
 def upload_video_to_channels():
-    """Process all channels in CHANNEL_TO_UPLOAD."""
-    for channel in CHANNEL_TO_UPLOAD:
-        try:
-            process_channel(channel)
-        except Exception as e:
-            print(f"🔥 Failed to process {channel}: {str(e)}")
+    """Process all channels in CHANNEL_TO_UPLOAD concurrently."""
+    run_channels(lambda channel: process_channel(channel) is not None, CHANNEL_TO_UPLOAD, label="Upload")
 
 
 if __name__ == "__main__":